@@ -0,0 +1,80 @@
+# backends.py
+import ctypes
+import time
+
+class PyDirectInputBackend:
+    """
+    pydirectinput (Windows の SendInput) でキーを送る出力先
+    send_batch は複数のキー操作を SendInput 1回にまとめて送る
+    (pydirectinput の内部構造体が使えない環境では1キーずつ送る)
+    """
+    def __init__(self):
+        import pydirectinput # Windows 以外でも output.py を import できるよう、使う時に読み込む
+        pydirectinput.PAUSE = 0
+        self._pdi = pydirectinput
+        self._can_batch = all(hasattr(pydirectinput, name) for name in
+                              ('Input', 'Input_I', 'KeyBdInput', 'KEYBOARD_MAPPING', 'SendInput'))
+
+    def key_down(self, key):
+        self._pdi.keyDown(key)
+
+    def key_up(self, key):
+        self._pdi.keyUp(key)
+
+    def send_batch(self, events):
+        """events は ('down' | 'up', key) の列。書かれた順にまとめて送る"""
+        inputs = self._build_inputs(events) if self._can_batch else None
+        if inputs is None:
+            for act, key in events:
+                self.key_down(key) if act == 'down' else self.key_up(key)
+            return
+        arr = (self._pdi.Input * len(inputs))(*inputs)
+        self._pdi.SendInput(len(inputs), arr, ctypes.sizeof(self._pdi.Input))
+
+    def _build_inputs(self, events):
+        # pydirectinput.keyDown/keyUp と同じ INPUT 構造体を作る (対応表に無いキーがあれば None)
+        pdi = self._pdi
+        inputs = []
+        for act, key in events:
+            code = pdi.KEYBOARD_MAPPING.get(key)
+            # 矢印キーは NumLock に応じた追加のスキャンコードが要るので pydirectinput に任せる
+            if code is None or key in ('up', 'left', 'down', 'right'): return None
+            flags = 0x0008 # KEYEVENTF_SCANCODE
+            if act == 'up':
+                flags |= 0x0002 # KEYEVENTF_KEYUP
+            ii_ = pdi.Input_I()
+            ii_.ki = pdi.KeyBdInput(0, code, flags, 0, ctypes.pointer(ctypes.c_ulong(0)))
+            inputs.append(pdi.Input(ctypes.c_ulong(1), ii_)) # INPUT_KEYBOARD
+        return inputs
+
+class RecordingBackend:
+    """
+    キーを送らずに記録だけする出力先 (ゲームが無い環境での動作確認・ベンチマーク用)
+    events には (時刻, 'down' | 'up', key) が送った順に入る。batches は send_batch の呼ばれた回数
+    """
+    def __init__(self, clock=None):
+        self.clock = clock
+        self.events = []
+        self.batches = 0
+
+    def _now(self):
+        return self.clock.now() if self.clock is not None else time.perf_counter()
+
+    def key_down(self, key):
+        self.events.append((self._now(), 'down', key))
+
+    def key_up(self, key):
+        self.events.append((self._now(), 'up', key))
+
+    def send_batch(self, events):
+        t = self._now()
+        self.batches += 1
+        self.events.extend((t, act, key) for act, key in events)
+
+    def keys(self):
+        """記録した (操作, キー) だけの列を返す"""
+        return [(act, key) for _, act, key in self.events]
+
+    def clear(self):
+        self.events.clear()
+        self.batches = 0
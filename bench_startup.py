@@ -0,0 +1,47 @@
+# bench_startup.py
+# main.py を別プロセスで何回か起動し、起動から「最初の画面が出るまで」「入力を受け付けるまで」の時間を測る
+# (Python 本体の起動と import も含めて測るため、毎回新しいプロセスで起動する)
+import json
+import os
+import subprocess
+import sys
+import time
+
+from const import FONT_CACHE_PATH
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+MARKS = ("boot", "first_frame", "input_ready") # boot は main.py の読み込み開始
+
+def run_once(env):
+    """main.py --startup-bench を1回起動し、{印: 起動してからの秒} を返す"""
+    t0 = time.perf_counter() # perf_counter はプロセスをまたいで比べられる単調時計
+    proc = subprocess.run([sys.executable, MAIN, "--startup-bench"], capture_output=True, text=True,
+                          env=env, timeout=60)
+    for line in proc.stdout.splitlines():
+        if line.startswith("STARTUP "):
+            marks = json.loads(line[len("STARTUP "):])
+            return {name: marks[name] - t0 for name in MARKS}
+    raise RuntimeError(f"main.py did not report startup times:\n{proc.stdout}{proc.stderr}")
+
+def bench(runs=5, dummy=False, cold=False):
+    """runs 回起動し、{印: 起動してからの秒のリスト} を返す。cold=True なら毎回フォントの保存結果を消して測る"""
+    env = dict(os.environ)
+    if dummy: env["SDL_VIDEODRIVER"] = "dummy" # ウィンドウを出さずに測る (CI など)
+    results = {name: [] for name in MARKS}
+    for _ in range(runs):
+        if cold and os.path.exists(FONT_CACHE_PATH): os.remove(FONT_CACHE_PATH)
+        for name, t in run_once(env).items():
+            results[name].append(t)
+    return results
+
+def main(argv):
+    """python bench_startup.py [--runs=5] [--dummy] [--cold] : 起動時間の中央値と最大を表示する"""
+    opts = dict(a[2:].split('=', 1) for a in argv if a.startswith('--') and '=' in a)
+    results = bench(int(opts.get('runs', 5)), '--dummy' in argv, '--cold' in argv)
+    for name, vals in results.items():
+        vals.sort()
+        print(f"{name:12s}: median {vals[len(vals) // 2] * 1000:7.1f} ms / max {vals[-1] * 1000:7.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
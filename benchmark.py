@@ -0,0 +1,227 @@
+# benchmark.py
+# 入力の変換・モードロジック・描画のよく通る処理の所要時間を測り、JSON に保存して基準値と比べる
+# 描画は SDL のダミービデオドライバで測る (ウィンドウは出さない)。キー送出は何もしない送出先に差し替える
+import json
+import os
+import platform
+import sys
+import timeit
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame
+
+from const import *
+from inputs import get_inputs, JoyState, StableNotchReader, DecodeTable, decode_table
+from modes import LOGIC_MODULES, logic_class
+from modes import default_context
+
+RESULT_PATH = "benchmark_result.json"
+BASELINE_PATH = "benchmark_baseline.json"
+TOLERANCE = 0.20 # 基準値よりこの割合以上遅くなったら退行とみなす
+
+# ロジックを測る構成 (表示名, ゲーム, 設定の上書き)
+LOGIC_VARIANTS = [
+    ("JRETS", "JRETS", {}),
+    ("JRETS auto", "JRETS", {"brake_mode": "2"}),
+    ("BVE", "BVE", {}),
+    ("BVE auto", "BVE", {"brake_mode": "2"}),
+    ("PCSX2 1H", "PCSX2", {}),
+    ("PCSX2 2H", "PCSX2", {"brake_mode": "2"}),
+    ("AE100", "PCSX2", {"ae100_mode": True, "max_brake": 5}),
+    ("RPCS3", "RPCS3", {}),
+    ("RPCS3 keihan", "RPCS3", {"keihan_mode": True})
+]
+
+class _NullOut:
+    """キーを送らず、待ちもしない送出先 (ロジック自体の処理時間だけを測る)"""
+    def key_down(self, key, owner=None, state=None, settle=0, urgent=False): pass
+    def key_up(self, key, owner=None, state=None, settle=0, urgent=False, guard=0): pass
+    def press(self, key, owner=None, state=None, settle=0, urgent=False): pass
+    def press_emu(self, key, owner=None, state=None, settle=0, urgent=False): pass
+    def cancel(self, owner=None): return {}
+
+class _FakeJoystick:
+    """get_button だけを持つコントローラーの代わり (ボタン状態は mask で与える)"""
+    def __init__(self, mask=0):
+        self.mask = mask
+
+    def get_button(self, i):
+        return (self.mask >> i) & 1
+
+def per_call(fn, calls=1, repeat=5):
+    """fn 1回で calls 件分を処理する時の、1件あたりの最短時間 (µs)"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number / calls * 1e6
+
+# --- 入力の変換 ---
+def bench_inputs():
+    pygame.display.init() # get_inputs の pygame.event.pump() に要る
+    results = {}
+    wiring = CONTROLLER_WIRINGS[CONTROLLER_WIRING]
+    masks = [_notch_mask(b_val, p_pat) for b_val in wiring['brake_map'] for p_pat in wiring['mascon_map']]
+    joy = _FakeJoystick()
+    def decode():
+        for mask in masks:
+            joy.mask = mask
+            get_inputs(joy)
+    results["inputs.get_inputs"] = per_call(decode, len(masks))
+
+    state = JoyState(None)
+    def apply():
+        for mask in masks:
+            state._apply(mask)
+    results["inputs.JoyState._apply"] = per_call(apply, len(masks))
+
+    pairs = decode_table().pairs
+    def lookup():
+        for mask in masks:
+            pairs[mask]
+    results["inputs.DecodeTable.pairs"] = per_call(lookup, len(masks))
+    results["inputs.DecodeTable.build"] = per_call(lambda: DecodeTable(CONTROLLER_WIRINGS[CONTROLLER_WIRING]), repeat=3)
+
+    # 隣の段への移動と、通過途中に一瞬だけ別の段が読める移動を交互に流す
+    codes = sorted(wiring['brake_map'].values())
+    seq = [(v, i * 0.001) for i, v in enumerate(codes + codes[::-1] + [-1, 0, 2, 1, 2, 0])]
+    reader = StableNotchReader(0, wiring['brake_map'], NOTCH_SETTLE_US)
+    def update():
+        for val, t in seq:
+            reader.update(val, t)
+    results["inputs.StableNotchReader.update"] = per_call(update, len(seq))
+    return results
+
+def _notch_mask(b_val, p_pat):
+    """JoyState._apply の逆: CONTROLLER_WIRING の配線で b_val と p_pat になるボタンのビットマスク"""
+    wiring = CONTROLLER_WIRINGS[CONTROLLER_WIRING]
+    brake = wiring['brake']
+    mask = 0
+    for pos, btn in enumerate(reversed(brake)): mask |= ((b_val >> pos) & 1) << (btn - 1)
+    for bit, btn in zip(p_pat, wiring['mascon']): mask |= bit << (btn - 1)
+    return mask
+
+# --- モードロジック ---
+def transition_matrix(context):
+    """NotchPipeline がロジックに渡しうる (cur_p, cur_b) の全ての組から全ての組への移動を並べた列"""
+    brakes = sorted(set(AUTO_BRAKE_MAP.values())) if context['brake_mode'] == "2" and context['game_mode'] in ["JRETS", "BVE"] \
+        else sorted(ELECTRIC_BRAKE_MAP.values())
+    states = [(p, 0) for p in range(context['max_power'] + 1)] + [(0, b) for b in brakes if b > 0]
+    seq = []
+    for a in states:
+        for b in states:
+            if a != b: seq += [a, b]
+    return seq
+
+def bench_logic():
+    results = {}
+    btns = [None] + [0] * 16
+    for label, game_mode, overrides in LOGIC_VARIANTS:
+        context = default_context(game_mode)
+        context.update(overrides)
+        logic = logic_class(game_mode)(_NullOut())
+        seq = transition_matrix(context)
+        logic.update(0, 0, btns, context) # 初回同期
+        def run():
+            for cur_p, cur_b in seq:
+                logic.update(cur_p, cur_b, btns, context)
+        results[f"logic.{label}.update"] = per_call(run, len(seq))
+    return results
+
+# --- 描画 ---
+def bench_render():
+    import ui
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    ui.init_fonts()
+    results = {}
+
+    def gauges():
+        for val in range(6):
+            ui.draw_bar_gauge(screen, 150, 180, val, 5, True)
+        for val in range(10):
+            ui.draw_bar_gauge(screen, 650, 180, val, 8, False)
+    def gauges_cold():
+        ui.gauge_cache.invalidate()
+        gauges()
+    results["render.draw_bar_gauge"] = per_call(gauges, 16)
+    results["render.draw_bar_gauge.build"] = per_call(gauges_cold, 16)
+
+    def dials():
+        for val in range(4):
+            ui.draw_auto_brake_unit(screen, 491, 193, val)
+    def dials_cold():
+        ui.dial_cache.invalidate()
+        dials()
+    results["render.draw_auto_brake_unit"] = per_call(dials, 4)
+    results["render.draw_auto_brake_unit.build"] = per_call(dials_cold, 4)
+
+    headers = [(game_mode, "1", False, False, False, False) for game_mode in LOGIC_MODULES] + [
+        ("PCSX2", "2", True, False, False, False), ("PCSX2", "1", False, True, False, False),
+        ("RPCS3", "1", False, False, True, False), ("PCSX2", "2", False, False, False, True)]
+    def titles():
+        for args in headers:
+            ui.draw_header_title(screen, *args, 70)
+    def titles_cold():
+        ui.header_cache.invalidate()
+        titles()
+    results["render.draw_header_title"] = per_call(titles, len(headers))
+    results["render.draw_header_title.build"] = per_call(titles_cold, len(headers))
+    pygame.quit()
+    return results
+
+# --- 保存と比較 ---
+def compare(results, baseline, tolerance=TOLERANCE):
+    """[(名前, 基準値, 今回, 比)] と、そのうち tolerance を超えて遅くなったものの名前のリストを返す"""
+    rows = []
+    regressions = []
+    for name, value in results.items():
+        base = baseline.get(name)
+        ratio = value / base if base else None
+        rows.append((name, base, value, ratio))
+        if ratio is not None and ratio > 1 + tolerance:
+            regressions.append(name)
+    return rows, regressions
+
+def main(argv):
+    """
+    python benchmark.py [--only=inputs,logic,render] [--out=benchmark_result.json] [--baseline=benchmark_baseline.json]
+                        [--tolerance=0.2] [--save-baseline]
+    結果 (1件あたりの µs) を --out に保存し、基準値より tolerance 以上遅いものがあれば終了コード 1 を返す
+    """
+    if '--help' in argv:
+        print(main.__doc__)
+        return 0
+    opts = dict(a[2:].split('=', 1) for a in argv if a.startswith('--') and '=' in a)
+    parts = {"inputs": bench_inputs, "logic": bench_logic, "render": bench_render}
+    only = opts['only'].split(',') if 'only' in opts else list(parts)
+    results = {}
+    for name in only:
+        results.update(parts[name]())
+
+    baseline_path = opts.get('baseline', BASELINE_PATH)
+    with open(opts.get('out', RESULT_PATH), 'w', encoding='utf-8') as f:
+        json.dump({
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pygame": pygame.version.ver,
+            "results": results
+        }, f, indent=2)
+    if '--save-baseline' in argv:
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump({"results": results}, f, indent=2)
+        print(f"Baseline saved to {baseline_path}")
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+    rows, regressions = compare(results, baseline, float(opts.get('tolerance', TOLERANCE)))
+    for name, base, value, ratio in rows:
+        base_str = f"{base:10.2f} us" if base else "         - "
+        ratio_str = f"x{ratio:.2f}" if ratio is not None else ""
+        mark = "  << REGRESSION" if name in regressions else ""
+        print(f"{name:40s} {base_str} -> {value:10.2f} us {ratio_str}{mark}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,46 @@
+# cache.py
+from collections import OrderedDict
+
+class LruCache:
+    """
+    描画済みSurfaceなどを使い回すための上限付きキャッシュ
+    上限を超えたら一番長く使われていないものから捨てる
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def get_or_build(self, key, build):
+        """key の値を返す。無ければ build() で作って登録する"""
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            value = build()
+            self._items[key] = value
+            if len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+            return value
+        self.hits += 1
+        self._items.move_to_end(key)
+        return value
+
+    def invalidate(self, pred=None):
+        """pred(key) が真になるものだけ捨てる。pred=None なら全部捨てる。捨てた件数を返す"""
+        if pred is None:
+            n = len(self._items)
+            self._items.clear()
+            return n
+        drop = [k for k in self._items if pred(k)]
+        for k in drop:
+            del self._items[k]
+        return len(drop)
+
+    def stats(self):
+        """(ヒット数, ミス数, 保持件数) を返す"""
+        return self.hits, self.misses, len(self._items)
@@ -0,0 +1,227 @@
+# checks.py
+# 送出キュー・手順表・ノイズ除去の動作確認 (ゲームもコントローラーも要らない)
+# キーは VirtualClock + RecordingBackend で仮想時刻に送り、ゲーム側の位置は gamesim.py のモデルで追う
+# python checks.py で全て実行し、失敗があれば終了コード 1 を返す
+import sys
+
+from backends import RecordingBackend
+from const import *
+from gamesim import model_for, run_model
+from inputs import StableNotchReader, _code_bits, _transient_table
+from modes.planner import MAX_AXIS, plan_config, plan_table, pc_plan_table
+from output import KeyScheduler
+from simulate import LOGIC_CLASSES, default_context
+from timing import VirtualClock
+
+class _Rig:
+    """仮想時刻の送出キューと、1つのモードのロジック"""
+    def __init__(self, game_mode, **overrides):
+        self.clock = VirtualClock()
+        self.backend = RecordingBackend(self.clock)
+        self.out = KeyScheduler(self.clock, self.backend, threaded=False)
+        self.context = default_context(game_mode)
+        self.context.update(overrides)
+        self.logic = LOGIC_CLASSES[game_mode](self.out)
+        self.btns = [None] + [0] * 16
+
+    def drive(self, moves):
+        """moves は (時刻, cur_p, cur_b) の列。その時刻まで送出を進めてから update し、最後に送り切る"""
+        for t, cur_p, cur_b in moves:
+            self.out.pump(t)
+            self.logic.update(cur_p, cur_b, self.btns, self.context)
+        self.out.pump()
+        return self.backend.events
+
+    def final_ok(self, moves):
+        """drive した後、ゲーム側モデルが最後の入力の位置に居るか"""
+        model = model_for(self.context['game_mode'], self.context)
+        model.sync(model.target_of(*moves[0][1:]))
+        run_model(model, self.backend.events)
+        return model.position == model.target_of(*moves[-1][1:])
+
+def _keys(events, act='down'):
+    return [key for _, a, key in events if a == act]
+
+# --- 送出キューの取り消し (user-002) ---
+def check_sweep_cancel():
+    """B1→B8 の段送りの途中で N に戻したら、送出中の1段だけ送り切って N へ戻す"""
+    for label, overrides in (("PCSX2 2H", {"brake_mode": "2"}), ("PCSX2 1H", {})):
+        rig = _Rig("PCSX2", **overrides)
+        moves = [(0.0, 0, 1), (0.01, 0, 8), (0.1, 0, 0)]
+        events = rig.drive(moves)
+        keys = _keys(events)
+        assert keys[-1] == KEY_PCSX2_N, (label, keys)
+        assert len(keys) <= 3, (label, keys) # 途中まで送った段送り (2回まで) + N
+        assert rig.final_ok(moves), (label, keys)
+        assert rig.logic.prev_axis == 0, (label, rig.logic.prev_axis)
+
+    # JRETS は段送りをまとめて送るので、取り消す前に送り終わっている
+    rig = _Rig("JRETS")
+    moves = [(0.0, 0, 1), (0.01, 0, 8), (0.02, 0, 0)]
+    rig.drive(moves)
+    assert rig.final_ok(moves), _keys(rig.backend.events)
+
+# --- リリースガード (user-003) ---
+def check_release_guard():
+    """AE100/京阪の定速 (P5) からブレーキへ入れた時、z を離してから N を押すまで PCSX2_RELEASE_GUARD 以上空ける"""
+    for label, game_mode, overrides in (("AE100", "PCSX2", {"ae100_mode": True, "max_brake": 5}),
+                                        ("RPCS3 keihan", "RPCS3", {"keihan_mode": True})):
+        rig = _Rig(game_mode, **overrides)
+        moves = [(0.0, 0, 0), (0.01, 5, 0), (1.0, 0, 3)]
+        events = rig.drive(moves)
+        t_up = max(t for t, act, key in events if act == 'up' and key == KEY_PCSX2_POWER_INC)
+        t_n = min(t for t, act, key in events if act == 'down' and key == KEY_PCSX2_N and t >= t_up)
+        assert t_n - t_up >= PCSX2_RELEASE_GUARD - 1e-9, (label, t_up, t_n)
+        assert rig.final_ok(moves), (label, _keys(events))
+
+def check_urgent_after_n():
+    """N を送った直後の非常は N のリセット待ちを打ち切って送り、遅延が URGENT_LATENCY_BOUND に収まる"""
+    for label, overrides in (("PCSX2 1H", {}), ("PCSX2 2H", {"brake_mode": "2"})):
+        rig = _Rig("PCSX2", **overrides)
+        moves = [(0.0, 0, 0), (0.01, 3, 0), (1.0, 0, 0), (1.01, 0, 14)]
+        events = rig.drive(moves)
+        t_eb = min(t for t, act, key in events if act == 'down' and key == KEY_PCSX2_EMG)
+        assert t_eb - 1.01 <= URGENT_LATENCY_BOUND + 1e-9, (label, t_eb)
+        assert rig.out.latency_stats()[3] <= URGENT_LATENCY_BOUND + 1e-9, (label, rig.out.latency_stats())
+        assert rig.final_ok(moves), (label, _keys(events))
+
+def check_jrets_auto_emergency():
+    """JRETS 自動空気ブレーキ: 常用 (. を押したまま) から非常へは、. を離してから / を押す"""
+    rig = _Rig("JRETS", brake_mode="2")
+    moves = [(0.0, 0, 0), (0.1, 0, 2), (0.2, 0, 3)]
+    events = rig.drive(moves)
+    i_up = max(i for i, (_, act, key) in enumerate(events) if act == 'up' and key == KEY_BRAKE_UP)
+    i_eb = min(i for i, (_, act, key) in enumerate(events) if act == 'down' and key == KEY_BRAKE_EMG)
+    assert i_up < i_eb, events
+    assert rig.final_ok(moves), events
+
+# --- 手順表 (user-018) ---
+# PCSX2/RPCS3 の構成 (表示名, ゲーム, 設定の上書き)。RPCS3 と 787系は非常キーを使わない
+PLAN_VARIANTS = [
+    ("PCSX2 1H", "PCSX2", {}),
+    ("PCSX2 2H", "PCSX2", {"brake_mode": "2"}),
+    ("midosuji", "PCSX2", {"brake_mode": "2", "midosuji_mode": True, "max_power": 4, "max_brake": 6}),
+    ("787", "PCSX2", {"brake_mode": "2", "mode_787": True, "max_brake": 7}),
+    ("PCSX2 1H B13", "PCSX2", {"max_brake": 13}),
+    ("RPCS3", "RPCS3", {}),
+]
+
+def check_emu_plans():
+    """全ての (今の軸, 目標の軸) について、手順をゲーム側モデルに流すと目標に着き、非常キーは目標が非常の時だけ使う"""
+    for label, game_mode, overrides in PLAN_VARIANTS:
+        ctx = default_context(game_mode)
+        ctx.update(overrides)
+        config = plan_config(ctx, has_emg=(game_mode == "PCSX2"))
+        eb = -(ctx['max_brake'] + 1)
+        for (prev, cur), steps in plan_table(config).items():
+            if prev > ctx['max_power'] or cur > ctx['max_power']: continue
+            where = (label, prev, cur, steps)
+            assert (len(steps) == 0) == (prev == cur), where
+            keys = [key for key, _, _, _ in steps]
+            if KEY_PCSX2_EMG in keys:
+                assert cur == eb and keys == [KEY_PCSX2_EMG], where
+            model = model_for(game_mode, ctx)
+            model.sync(prev)
+            for key, val, _, _ in steps:
+                model.press(key)
+                model.release(key)
+                assert model.position == val, where
+            assert model.position == cur, where
+
+    # 段送りの途中で非常を挟まない
+    two = plan_config(dict(default_context("PCSX2"), brake_mode="2"))
+    assert [k for k, _, _, _ in plan_table(two)[(-1, -8)]] == [KEY_PCSX2_BRAKE_INC] * 7
+    assert [k for k, _, _, _ in plan_table(two)[(3, -9)]] == [KEY_PCSX2_EMG]
+    one = plan_config(default_context("PCSX2"))
+    assert [k for k, _, _, _ in plan_table(one)[(-1, -8)]] == [KEY_PCSX2_POWER_DEC] * 7
+    # 力行から遠いブレーキへは N で一気に戻してから送る
+    assert [k for k, _, _, _ in plan_table(one)[(5, -1)]][0] == KEY_PCSX2_N
+
+def check_pc_plans():
+    """JRETS/BVE: 手順を1段ずつたどると目標に着き、非常キーは目標が非常の時だけ1回で使う"""
+    for handle, tops in (("mascon", range(1, MAX_AXIS + 1)), ("brake", range(1, 14))):
+        for max_val in tops:
+            eb = max_val + 1
+            for (prev, cur), steps in pc_plan_table(handle, max_val).items():
+                where = (handle, max_val, prev, cur, steps)
+                assert (len(steps) == 0) == (prev == cur), where
+                pos = prev
+                for key, val, _, _ in steps:
+                    if key in (KEY_MASCON_UP, KEY_BRAKE_UP): assert val == pos + 1, where
+                    elif key in (KEY_MASCON_DOWN, KEY_BRAKE_DOWN): assert val == pos - 1, where
+                    elif key in (KEY_MASCON_N, KEY_BRAKE_N): assert val == 0, where
+                    elif key == KEY_BRAKE_EMG: assert val == eb and cur == eb and len(steps) == 1, where
+                    else: assert False, where
+                    pos = val
+                assert pos == cur, where
+    assert [k for k, _, _, _ in pc_plan_table("brake", 8)[(1, 7)]] == [KEY_BRAKE_UP] * 6
+    assert [k for k, _, _, _ in pc_plan_table("brake", 8)[(9, 2)]] == [KEY_BRAKE_N, KEY_BRAKE_UP, KEY_BRAKE_UP]
+
+# --- 通過途中に読める段の表 (user-019) ---
+def _transients_by_flipping(code_map):
+    """_transient_table と同じものを、切り替わるビットの部分集合を全て試して求める"""
+    bits = {val: _code_bits(code) for code, val in code_map.items()}
+    notch_of = {code: val for val, code in bits.items()}
+    table = {}
+    for val, code in bits.items():
+        found = set()
+        for nb in (val - 1, val + 1):
+            if nb not in bits: continue
+            moving = code ^ bits[nb]
+            sub = moving
+            while sub: # moving の空でない部分集合を全て列挙する
+                other = notch_of.get(code ^ sub)
+                if other is not None and other not in (val, nb): found.add(other)
+                sub = (sub - 1) & moving
+        table[val] = frozenset(found)
+    return table
+
+def check_transient_tables():
+    """電気ブレーキ・マスコンの両方で、怪しい段の表が総当たりの結果と一致する"""
+    for name, code_map in (("brake", ELECTRIC_BRAKE_MAP), ("mascon", MASCON_LEVEL_MAP)):
+        assert _transient_table(code_map) == _transients_by_flipping(code_map), name
+    table = _transient_table(ELECTRIC_BRAKE_MAP)
+    assert 2 in table[0]   # N→B1 の途中の B2
+    assert 14 in table[6]  # B6→B7 の途中の EB
+    assert not table[14]   # EB→B13 は1ビットだけ変わる
+
+def check_notch_reader():
+    """一瞬だけ読めた段は捨て、続いた段は NOTCH_SETTLE_US 後に確定し、怪しくない段は遅らせない"""
+    settle = NOTCH_SETTLE_US / 1e6
+    reader = StableNotchReader(0, ELECTRIC_BRAKE_MAP, NOTCH_SETTLE_US)
+    assert reader.update(2, 0.0) == 0           # N→B1 の途中の B2 は保留
+    assert reader.update(1, 0.0005) == 1        # B1 に落ち着いたら即確定 (B2 は捨てる)
+    assert reader.stats()["suppressed"] == 1
+    assert reader.update(3, 1.0) == 3           # B1 から怪しい段 (B2) 以外へは即確定
+    reader = StableNotchReader(0, ELECTRIC_BRAKE_MAP, NOTCH_SETTLE_US)
+    assert reader.update(2, 0.0) == 0
+    assert reader.deadline == settle
+    assert reader.update(-1, settle) == 2       # B2 のまま続いたら期限で確定
+    assert reader.stats()["delayed"] == 1
+
+CHECKS = [
+    check_sweep_cancel,
+    check_release_guard,
+    check_urgent_after_n,
+    check_jrets_auto_emergency,
+    check_emu_plans,
+    check_pc_plans,
+    check_transient_tables,
+    check_notch_reader,
+]
+
+def main(argv):
+    """python checks.py : 動作確認を全て実行し、失敗したものを表示する"""
+    failed = 0
+    for check in CHECKS:
+        try:
+            check()
+            print(f"OK  {check.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"NG  {check.__name__}: {e}")
+    print(f"{len(CHECKS) - failed}/{len(CHECKS)} passed")
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,17 +1,55 @@
 # const.py
+import os
+import sys
+
 import pygame
 
+# ★アプリが書き出すファイルの置き場所 (カレントディレクトリではなくアプリの隣)
+# exe版は exe のあるフォルダ (sys._MEIPASS は終了時に消える展開先なので使わない)、ソースから実行する時はこのファイルのあるフォルダ
+APP_DIR = os.path.dirname(os.path.abspath(sys.executable if getattr(sys, 'frozen', False) else __file__))
+
 # ★PCSX2/RPCS3モード専用設定 (秒)
 PCSX2_PRESS_DURATION = 0.04
 PCSX2_RELEASE_DURATION = 0.04
 PCSX2_RESET_WAIT = 0.05
+PCSX2_RELEASE_GUARD = 0.05 # AE100/京阪の定速解除(zを離す)後の待ち
+# 高精度タイマー: 締め切りのこの秒数前からはsleepせずスピンで待つ
+TIMER_SPIN_WINDOW = 0.002
+# 非常ブレーキ・Nショートカットの送出遅延の許容値 (押下幅1回分 + 余裕)
+URGENT_LATENCY_BOUND = PCSX2_PRESS_DURATION + 0.015
+# ★gamesim.py のエミュレータ側モデル: キー入力を拾える最小の押下幅・解放時間 (60fpsの1フレーム)
+EMU_MIN_PRESS = 1 / 60
+EMU_MIN_RELEASE = 1 / 60
 
 FPS = 60
+INPUT_POLL_HZ = 1000 # 省電力モードOFF時のイベント汲み上げ周期 (描画のFPSとは独立)
+# ★省電力モード: 入力やマウス操作が来るまでメインループを眠らせる (停車中のCPU使用率をほぼ0にする)
+IDLE_WAIT_MODE = True
+IDLE_WAIT_TIMEOUT_MS = 500
+SAMPLER_IDLE_TIMEOUT = 0.5 # 入力スレッドの待ちの上限 (秒)
+# ★段の通過途中に一瞬だけ読める別の段を捨てる時間窓 (µs)。怪しい段はこの間続いた時だけ確定する
+NOTCH_SETTLE_US = 8000
+# ★ハンドル操作→キー送出の遅延計測 (latency.py)。F3 で画面に表示、F4 で書き出し
+LATENCY_RING_SIZE = 1024 # 段階ごとに保持する直近の件数
+LATENCY_DUMP_PATH = os.path.join(APP_DIR, "latency_dump.txt")
+LATENCY_OVERLAY_INTERVAL = 0.5 # 表示の更新間隔 (秒)
+# ★メインループの停止監視 (watchdog.py)。1周がこの秒数を超えたらメインスレッドのスタックを採って書き出す。None なら監視しない
+WATCHDOG_BUDGET = 0.1
+WATCHDOG_SAMPLE_INTERVAL = 0.005 # 止まっている間のスタック採取の間隔 (秒)
+WATCHDOG_MAX_SAMPLES = 200 # 1回の停止で採る最大数 (これを超えても終わらなければ「継続中」として書き出す)
+WATCHDOG_REPORT_PATH = os.path.join(APP_DIR, "stall_report.txt")
+WATCHDOG_REPORT_MAX_BYTES = 256 * 1024 # これを超えたら stall_report.txt.1 に退避して書き直す (残すのは直近2ファイル分)
+# ★起動時間短縮: 見つけたフォントファイルの場所を保存しておき、次回からシステムのフォント走査を省く
+FONT_CACHE_PATH = os.path.join(APP_DIR, "font_cache.json")
+# ★入力の記録先 (input_trace.py で再生できる)。None なら記録しない
+INPUT_TRACE_PATH = None
 
 # --- 画面設定 ---
 SCREEN_WIDTH = 800
 SCREEN_HEIGHT = 600
 MARGIN_SIDE = 100
+GAUGE_CACHE_SIZE = 96 # 描画済みゲージの保持数 (1画面構成あたり最大15枚程度)
+TEXT_CACHE_SIZE = 256 # 描画済み文字列の保持数
 
 # --- 色定義 (RGB) ---
 COLOR_BG = (30, 30, 30)
@@ -101,4 +139,16 @@ MASCON_LEVEL_MAP = {
     (0, 1, 1): 3, # P3
     (0, 1, 0): 4, # P4
     (0, 0, 1): 5  # P5
-}
\ No newline at end of file
+}
+
+# --- コントローラーの配線 ---
+# brake / mascon: ビットパターンの各ビットがどのボタン番号 (1始まり、上位ビットから) に出るか
+# brake_map / mascon_map: そのビットパターン → 段 (ブレーキは電気指令式の段 0〜14 に揃える。自動空気ブレーキへはその段から変換する)
+# 配線やビットの割り当ての違うコントローラーはここに追加して CONTROLLER_WIRING で選ぶ
+# (inputs.DecodeTable がこの表から変換表を作り、StableNotchReader も同じ対応表を使う)
+CONTROLLER_WIRINGS = {
+    # 電車でGO!コントローラー (ツーハンドル)
+    "dengo": {"brake": (6, 8, 5, 7), "mascon": (14, 16, 1),
+              "brake_map": ELECTRIC_BRAKE_MAP, "mascon_map": MASCON_LEVEL_MAP},
+}
+CONTROLLER_WIRING = "dengo"
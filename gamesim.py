@@ -0,0 +1,288 @@
+# gamesim.py
+# ゲーム側のノッチ位置をキー操作から再現するモデルと、送出キー列の採点
+# simulate.py で作ったキーの時系列をモデルに流し、狙った段に正しく・どれだけ速く着いたかを調べる
+# (エミュレータ無しで押下幅や送り方を調整するため)
+import sys
+
+from const import EMU_MIN_PRESS, EMU_MIN_RELEASE
+from sampler import NotchPipeline
+from input_trace import read_trace, mask_to_btns, settle_points
+from simulate import simulate, default_context
+
+_EPS = 1e-9
+
+class NotchModel:
+    """
+    ゲーム側モデルの基底クラス
+    min_press より短い押下、min_release より短い間隔での同じキーの再押下はゲームが拾わないものとする
+    position は比較用の現在位置 (target_of と同じ形)
+    """
+    min_press = 0.0
+    min_release = 0.0
+
+    def __init__(self, context):
+        self.max_power = context['max_power']
+        self.max_brake = context['max_brake']
+        self.brake_mode = context.get('brake_mode', '1')
+        self.position = None
+
+    def sync(self, target):
+        """初回同期: ゲームは最初からハンドルと同じ位置にいるとみなす"""
+        self.position = target
+
+    def press(self, key):
+        pass
+
+    def release(self, key):
+        pass
+
+    def target_of(self, cur_p, cur_b):
+        """NotchPipeline がロジックに渡す (cur_p, cur_b) から、ゲームが居るべき位置を返す"""
+        raise NotImplementedError
+
+class JretsModel(NotchModel):
+    """JRETS: マスコン・ブレーキ別々の (p, b)。自動空気ブレーキは 0:運転 1:重なり 2:常用 3:非常"""
+    def press(self, key):
+        p, b = self.position
+        if key == 'z': p = min(p + 1, self.max_power)
+        elif key == 'a': p = max(p - 1, 0)
+        elif key == 's': p = 0
+        elif self.brake_mode == "2":
+            if key == 'm': b = 0
+            elif key == '.': b = 2 # 押している間は常用
+            elif key == '/': b = 3
+        else:
+            if key == '.': b = min(b + 1, self.max_brake)
+            elif key == ',': b = max(b - 1, 0)
+            elif key == 'm': b = 0
+            elif key == '/': b = self.max_brake + 1
+        self.position = (p, b)
+
+    def release(self, key):
+        p, b = self.position
+        if self.brake_mode == "2" and key == '.' and b == 2:
+            self.position = (p, 1) # 離すと重なり
+
+    def target_of(self, cur_p, cur_b):
+        if self.brake_mode == "2":
+            b = cur_b
+        else:
+            b = self.max_brake + 1 if cur_b == 14 else min(cur_b, self.max_brake)
+        return (0 if b > 0 else cur_p, b)
+
+class BveModel(JretsModel):
+    """BVE: (p, b)。自動空気ブレーキは 0〜3 を1段ずつ、非常は / で直接"""
+    def press(self, key):
+        p, b = self.position
+        b_max = 3 if self.brake_mode == "2" else self.max_brake
+        if key == 'z': p = min(p + 1, self.max_power)
+        elif key == 'a': p = max(p - 1, 0)
+        elif key == 's': p = 0
+        elif key == 'm' and self.brake_mode == "1": b = 0
+        elif key == '.': b = min(b + 1, b_max)
+        elif key == ',': b = max(b - 1, 0)
+        elif key == '/': b = 3 if self.brake_mode == "2" else self.max_brake + 1
+        self.position = (p, b)
+
+    def release(self, key):
+        pass
+
+class EmuOneHandleModel(NotchModel):
+    """
+    PCSX2/RPCS3 のワンハンドル: 軸位置 (力行が正、ブレーキが負、非常は -(max_brake+1))
+    constant_speed=True は AE100/京阪の定速 (P4 で z を押している間だけ 5)
+    """
+    min_press = EMU_MIN_PRESS
+    min_release = EMU_MIN_RELEASE
+
+    def __init__(self, context, constant_speed=False):
+        super().__init__(context)
+        self.constant_speed = constant_speed
+        self.midosuji = context.get('midosuji_mode', False)
+
+    def press(self, key):
+        axis = self.position
+        if key == 'z':
+            if self.constant_speed and axis == 4: axis = 5
+            else: axis = min(axis + 1, 4 if self.constant_speed else self.max_power)
+        elif key == 'q': axis = max(axis - 1, -(self.max_brake + 1))
+        elif key == 's': axis = 0
+        elif key == '/': axis = -(self.max_brake + 1)
+        self.position = axis
+
+    def release(self, key):
+        if self.constant_speed and key == 'z' and self.position == 5:
+            self.position = 4
+
+    def target_of(self, cur_p, cur_b):
+        if cur_b == 14: b = self.max_brake + 1
+        elif self.midosuji and cur_b > self.max_brake: b = self.max_brake
+        else: b = min(cur_b, self.max_brake)
+        return -b if b > 0 else cur_p
+
+class EmuTwoHandleModel(EmuOneHandleModel):
+    """PCSX2/RPCS3 のツーハンドル: 内部は (p, b)、比較は軸位置で行う。inverted は御堂筋線 (. と , が逆)"""
+    def __init__(self, context, inverted=False):
+        super().__init__(context)
+        self.inverted = inverted
+        self.p = 0
+        self.b = 0
+
+    def sync(self, target):
+        self.p, self.b = max(target, 0), max(-target, 0)
+        self.position = target
+
+    def press(self, key):
+        b_inc, b_dec = (',', '.') if self.inverted else ('.', ',')
+        if key == 'z': self.p = min(self.p + 1, self.max_power)
+        elif key == 'q': self.p = max(self.p - 1, 0)
+        elif key == b_inc: self.b = min(self.b + 1, self.max_brake + 1)
+        elif key == b_dec: self.b = max(self.b - 1, 0)
+        elif key == 's': self.p, self.b = 0, 0
+        elif key == '/': self.b = self.max_brake + 1
+        self.position = -self.b if self.b > 0 else self.p
+
+    def release(self, key):
+        pass
+
+def model_for(game_mode, context):
+    """ゲームと設定に合ったモデルを作る"""
+    if game_mode == "JRETS": return JretsModel(context)
+    if game_mode == "BVE": return BveModel(context)
+    if context.get('brake_mode', '1') == "2":
+        return EmuTwoHandleModel(context, inverted=context.get('midosuji_mode', False))
+    return EmuOneHandleModel(context, constant_speed=context.get('ae100_mode', False) or context.get('keihan_mode', False))
+
+class _TargetProbe:
+    """NotchPipeline がロジックに渡す値を横取りするだけのロジック"""
+    def __init__(self):
+        self.needs_sync = False
+        self.last = None
+
+    def update(self, cur_p, cur_b, raw_btns, context):
+        self.last = (cur_p, cur_b)
+
+def targets_of(samples, game_mode, context, model):
+    """入力の列から (時刻, ゲームが居るべき位置) の変化点を返す"""
+    probe = _TargetProbe()
+    pipeline = NotchPipeline({game_mode: probe})
+    targets = []
+    for t, b_val, p_pat, mask, _ in settle_points(samples, pipeline):
+        pipeline.step(mask, mask_to_btns(mask), context, t)
+        target = model.target_of(*probe.last)
+        if not targets or targets[-1][1] != target:
+            targets.append((t, target))
+    return targets
+
+def run_model(model, events):
+    """
+    キーの時系列をモデルに流し、(位置の変化の時系列, 受け付けた押下数, 拾われなかった押下数) を返す
+    押下はキーを押してから min_press 後に反映し、解放は離した時点で反映する
+    """
+    actions = [] # (時刻, 並び順, 'press' | 'release', key)
+    down = {}
+    last_up = {}
+    accepted = dropped = 0
+    for seq, (t, act, key) in enumerate(events):
+        if act == 'down':
+            if key not in down: down[key] = (t, seq)
+            continue
+        if key not in down: continue
+        t_down, seq_down = down.pop(key)
+        gap = t_down - last_up.get(key, float('-inf'))
+        last_up[key] = t
+        if t - t_down + _EPS >= model.min_press and gap + _EPS >= model.min_release:
+            actions.append((t_down + model.min_press, seq_down, 'press', key))
+            actions.append((t, seq, 'release', key))
+            accepted += 1
+        else:
+            dropped += 1
+    for key, (t_down, seq_down) in down.items(): # 押しっぱなしのまま終わったキー
+        actions.append((t_down + model.min_press, seq_down, 'press', key))
+        accepted += 1
+    actions.sort()
+
+    timeline = []
+    for t, _, kind, key in actions:
+        before = model.position
+        getattr(model, kind)(key)
+        if model.position != before:
+            timeline.append((t, model.position))
+    return timeline, accepted, dropped
+
+def score(targets, initial, timeline):
+    """
+    目標の変化点ごとに、次の目標が来るまでに着いたか・着くまでの時間を調べる
+    戻り値: (着いた数, 着くまでの時間のリスト, 最終位置が最後の目標と一致したか)
+    """
+    reached = 0
+    settle = []
+    pos = initial
+    j = 0
+    for i, (t0, target) in enumerate(targets):
+        t1 = targets[i + 1][0] if i + 1 < len(targets) else float('inf')
+        while j < len(timeline) and timeline[j][0] <= t0:
+            pos = timeline[j][1]; j += 1
+        t_ok = t0 if pos == target else None
+        while j < len(timeline) and timeline[j][0] < t1:
+            pos = timeline[j][1]; j += 1
+            t_ok = timeline[j - 1][0] if pos == target else None
+        if t_ok is not None:
+            reached += 1
+            settle.append(t_ok - t0)
+    final_ok = (timeline[-1][1] if timeline else initial) == targets[-1][1]
+    return reached, settle, final_ok
+
+def evaluate(samples, game_mode, context=None, press_duration=None, release_duration=None):
+    """記録した入力をロジック→ゲーム側モデルの順に流し、採点結果を辞書で返す"""
+    ctx = default_context(game_mode)
+    if context: ctx.update(context)
+    stats = {}
+    events = simulate(samples, game_mode, ctx, press_duration, release_duration, stats)
+    model = model_for(game_mode, ctx)
+    targets = targets_of(samples, game_mode, ctx, model)
+    model.sync(targets[0][1])
+    timeline, accepted, dropped = run_model(model, events)
+    # 初回の同期分 (キーを送らない) は採点から除く
+    reached, settle, final_ok = score(targets[1:], targets[0][1], timeline) if len(targets) > 1 else (0, [], True)
+    return {
+        "targets": len(targets) - 1,
+        "reached": reached,
+        "final_ok": final_ok,
+        "settle_mean": sum(settle) / len(settle) if settle else 0.0,
+        "settle_max": max(settle) if settle else 0.0,
+        "presses": accepted,
+        "dropped": dropped,
+        "pulse": stats["pulse"] # 直近に送出した押下幅 (件数, 最小, 中央値, 最大)。押下幅を詰める時はモデルの min_press と比べる
+    }
+
+# CLI で採点する構成 (表示名, ゲーム, 設定の上書き)
+VARIANTS = [
+    ("JRETS", "JRETS", {}),
+    ("BVE", "BVE", {}),
+    ("PCSX2 1H", "PCSX2", {}),
+    ("PCSX2 2H", "PCSX2", {"brake_mode": "2"}),
+    ("AE100", "PCSX2", {"ae100_mode": True, "max_brake": 5}),
+    ("RPCS3 京阪", "RPCS3", {"keihan_mode": True}),
+]
+
+def main(argv):
+    """python gamesim.py 記録ファイル [--press-ms=40] [--release-ms=40] : 各構成で到達率と到達時間を表示する"""
+    args = [a for a in argv if not a.startswith('--')]
+    if not args:
+        print(main.__doc__)
+        return 1
+    opts = dict(a[2:].split('=', 1) for a in argv if a.startswith('--') and '=' in a)
+    press = float(opts['press-ms']) / 1000 if 'press-ms' in opts else None
+    release = float(opts['release-ms']) / 1000 if 'release-ms' in opts else None
+    samples = list(read_trace(args[0]))
+    for label, game_mode, ctx in VARIANTS:
+        r = evaluate(samples, game_mode, ctx, press, release)
+        print(f"{label:10s}: reached {r['reached']}/{r['targets']}, final {'OK' if r['final_ok'] else 'NG'}, "
+              f"settle mean {r['settle_mean'] * 1000:.1f} ms / max {r['settle_max'] * 1000:.1f} ms, "
+              f"presses {r['presses']} (dropped {r['dropped']}), "
+              f"pulse min {r['pulse'][1] * 1000:.1f} / max {r['pulse'][3] * 1000:.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,152 @@
+# headless.py
+# ウィンドウを出さずに変換だけを行う起動方法 (運転台PCなどで、描画の分のCPUをシミュレータに回す用)
+# pygame はジョイスティックとイベントキューだけを初期化し、ui.py (フォント・描画) は一切読み込まない
+import json
+import os
+import signal
+import sys
+import threading
+
+import pygame
+
+from const import *
+from inputs import JoyState
+from input_trace import TraceRecorder
+from output import scheduler
+from sampler import NotchPipeline, InputSampler
+from modes import LOGIC_MODULES, default_context, logic_class
+
+# 特殊モード: main.py の各トグルと同じ設定をまとめて入れる (対応するゲーム, 上書きする設定)
+PROFILES = {
+    "midosuji": ("PCSX2", {"midosuji_mode": True, "brake_mode": "2", "max_power": 4, "max_brake": 6}),
+    "ae100": ("PCSX2", {"ae100_mode": True, "brake_mode": "1", "max_power": 5, "max_brake": 5}),
+    "787": ("PCSX2", {"mode_787": True, "brake_mode": "2", "max_power": 5, "max_brake": 7}),
+    "keihan": ("RPCS3", {"keihan_mode": True, "brake_mode": "1", "max_power": 5, "max_brake": 8})
+}
+
+# コマンドラインのオプション名 → context のキーと変換
+_OPTIONS = {
+    "brake-mode": ("brake_mode", str),
+    "max-power": ("max_power", int),
+    "max-brake": ("max_brake", int)
+}
+
+def build_context(argv):
+    """
+    コマンドライン (と --config= の設定ファイル) から context を作る。優先順位は 既定値 < 設定ファイル < コマンドライン
+    設定ファイルは JSON で、context と同じキー (game_mode, brake_mode, max_power, max_brake) と profile を書ける
+    ゲームを指定せずに profile だけを指定した時は、そのプロファイルのゲームで動かす
+    設定がおかしい時は ValueError
+    """
+    args = [a for a in argv if not a.startswith('--')]
+    opts = dict(a[2:].split('=', 1) for a in argv if a.startswith('--') and '=' in a)
+
+    config = {}
+    if 'config' in opts:
+        with open(opts['config'], encoding='utf-8') as f:
+            config = json.load(f)
+    profile = opts.get('profile', config.get('profile'))
+    if profile and profile not in PROFILES:
+        raise ValueError(f"Unknown profile: {profile}")
+    game_mode = args[0] if args else config.get('game_mode', PROFILES[profile][0] if profile else "JRETS")
+    if game_mode not in LOGIC_MODULES:
+        raise ValueError(f"Unknown game mode: {game_mode}")
+    context = default_context(game_mode)
+
+    if profile:
+        game, values = PROFILES[profile]
+        if game != game_mode:
+            raise ValueError(f"Profile {profile} is for {game}.")
+        context.update(values)
+    for opt, (name, conv) in _OPTIONS.items():
+        value = opts.get(opt, config.get(name))
+        if value is None: continue
+        if profile: raise ValueError(f"{name} cannot be combined with a profile.")
+        context[name] = conv(value)
+
+    # main.py の段数設定ボタンと同じ範囲
+    if context['brake_mode'] not in ("1", "2"):
+        raise ValueError(f"brake_mode must be 1 or 2: {context['brake_mode']}")
+    if not 1 <= context['max_power'] <= 5:
+        raise ValueError(f"max_power must be 1-5: {context['max_power']}")
+    if not 1 <= context['max_brake'] <= 13:
+        raise ValueError(f"max_brake must be 1-13: {context['max_brake']}")
+    return context
+
+def open_joystick():
+    """接続されている最初のコントローラーを返す (無ければ None)"""
+    if pygame.joystick.get_count() == 0: return None
+    joy = pygame.joystick.Joystick(0)
+    joy.init()
+    return joy
+
+def run(context):
+    """Ctrl+C か SIGTERM が来るまで変換を続ける"""
+    # ★ウィンドウは作らない。イベントキューのために display だけ初期化する (ダミーのビデオドライバで十分)
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ["SDL_JOYSTICK_ALLOW_BACKGROUND_EVENTS"] = "1"
+    pygame.display.init()
+    pygame.joystick.init()
+
+    joy = open_joystick()
+    joy_state = JoyState(joy)
+    if joy is None: print("No controller found. Waiting for one to be connected...")
+
+    logic = logic_class(context['game_mode'])()
+    sampler = InputSampler(joy_state, NotchPipeline({context['game_mode']: logic}), context, threading.Lock())
+    sampler.start()
+
+    trace_rec = None
+    if INPUT_TRACE_PATH:
+        trace_rec = TraceRecorder(INPUT_TRACE_PATH)
+        trace_rec.attach(joy_state)
+
+    running = [True]
+    def request_stop(*args):
+        running[0] = False
+    signal.signal(signal.SIGTERM, request_stop)
+    print(f"Running headless: {context['game_mode']}, brake_mode {context['brake_mode']}, "
+          f"P{context['max_power']} / B{context['max_brake']}. Press Ctrl+C to stop.")
+    try:
+        while running[0]:
+            # 入力が来るまで眠る (タイムアウトは終了要求を見るため)
+            first = pygame.event.wait(IDLE_WAIT_TIMEOUT_MS)
+            events = pygame.event.get()
+            if first.type != pygame.NOEVENT: events.insert(0, first)
+            for event in events:
+                if joy_state.handle_event(event): continue
+                if event.type == pygame.QUIT: running[0] = False
+                elif event.type == pygame.JOYDEVICEADDED and joy_state.joy is None:
+                    # 後から繋がったコントローラーを使い始める (ゲーム側とは最初の入力で同期し直す)
+                    joy_state.joy = open_joystick()
+                    with sampler.lock:
+                        logic.reset()
+                    joy_state.resync()
+                    print("Controller connected.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sampler.stop()
+        if trace_rec is not None: trace_rec.close()
+        scheduler.stop() # 未送信のキーを破棄し、押しっぱなしのキーを離す
+        pygame.quit()
+
+def main(argv):
+    """
+    python headless.py [ゲーム] [--profile=ae100|midosuji|787|keihan] [--brake-mode=2] [--max-power=5] [--max-brake=8] [--config=設定.json]
+    ウィンドウを出さずに変換だけを行う (ゲームは JRETS / BVE / PCSX2 / RPCS3、既定は JRETS。--profile だけならそのゲーム)
+    """
+    if '--help' in argv:
+        print(main.__doc__)
+        return 0
+    try:
+        context = build_context(argv)
+    except (ValueError, OSError) as e:
+        print(f"Error: {e}")
+        print(main.__doc__)
+        return 1
+    run(context)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
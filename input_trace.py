@@ -0,0 +1,139 @@
+# input_trace.py
+# コントローラー入力の記録・再生
+# ファイル形式 (リトルエンディアン):
+#   ヘッダー : マジック b'DGTR', バージョン (uint16), 予約 (uint16)
+#   レコード : 前のレコードからの経過時間 µs (uint32), b_val (uint8),
+#              p_pat をビットに詰めた値 (uint8), ボタンのビットマスク (uint16)
+#   再生時の段の変換はボタンのビットマスクから行う (b_val / p_pat は記録時の表示用の値)
+# 入力が変わった時だけ1レコード (8バイト) 書くので、1時間運転しても数百KB程度に収まる
+import struct
+import sys
+import time
+
+from const import CONTROLLER_WIRINGS, CONTROLLER_WIRING
+
+TRACE_MAGIC = b'DGTR'
+TRACE_VERSION = 1
+_HEADER = struct.Struct('<4sHH')
+_RECORD = struct.Struct('<IBBH')
+_MAX_DT_US = 0xFFFFFFFF
+
+def pack_p_pat(p_pat):
+    """p_pat (ビットのタプル、先頭が上位) を整数に詰める"""
+    bits = 0
+    for b in p_pat: bits = (bits << 1) | b
+    return bits
+
+def unpack_p_pat(bits, width=None):
+    """pack_p_pat の逆。width は p_pat のビット数 (省略時は今の配線のマスコンのビット数)"""
+    if width is None: width = len(CONTROLLER_WIRINGS[CONTROLLER_WIRING]['mascon'])
+    return tuple((bits >> (width - 1 - i)) & 1 for i in range(width))
+
+def mask_to_btns(mask):
+    """ビットマスクを get_inputs と同じ1始まりのボタンリストにする"""
+    return [None] + [(mask >> i) & 1 for i in range(16)]
+
+class TraceRecorder:
+    """入力の変化を1件ずつファイルへ追記するクラス"""
+    def __init__(self, path):
+        self.f = open(path, 'wb')
+        self.f.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, 0))
+        self.count = 0
+        self._last_t = None
+
+    def record(self, mask, b_val, p_pat, t=None):
+        if t is None: t = time.perf_counter()
+        dt = 0 if self._last_t is None else int(round((t - self._last_t) * 1e6))
+        self._last_t = t
+        self.f.write(_RECORD.pack(min(max(dt, 0), _MAX_DT_US), b_val, pack_p_pat(p_pat), mask))
+        self.count += 1
+
+    def attach(self, joy_state):
+        """joy_state の変化を全て記録する (既に登録されている listener も今まで通り呼ぶ)"""
+        prev = joy_state.listener
+        def listener():
+            self.record(*joy_state.state)
+            if prev is not None: prev()
+        joy_state.listener = listener
+        self.record(*joy_state.state) # 記録開始時点の状態
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+def read_trace(path):
+    """記録ファイルから (開始からの秒数, b_val, p_pat, mask) を順に返す"""
+    with open(path, 'rb') as f:
+        magic, version, _ = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError(f"{path} is not an input trace (version {TRACE_VERSION}).")
+        t_us = 0
+        width = len(CONTROLLER_WIRINGS[CONTROLLER_WIRING]['mascon'])
+        for dt, b_val, p_bits, mask in _RECORD.iter_unpack(f.read()):
+            t_us += dt
+            yield t_us / 1e6, b_val, unpack_p_pat(p_bits, width), mask
+
+def settle_points(samples, pipeline):
+    """
+    入力の列に、StableNotchReader が保留した段を確定させる時刻の再サンプル (直前と同じ入力) を差し込む
+    実機では入力スレッドがその時刻に起きて step し直すため、再生・シミュレーションでも同じ時刻に step させる
+    (秒, b_val, p_pat, mask, 入力が変化した時刻) を返す (再サンプルの最後の要素は元の入力の時刻)
+    """
+    prev = None
+    for sample in samples:
+        while prev is not None:
+            deadline = pipeline.deadline()
+            if deadline is None or deadline >= sample[0]: break
+            yield (deadline,) + prev[1:]
+        prev = tuple(sample) + (sample[0],)
+        yield prev
+    while prev is not None and pipeline.deadline() is not None:
+        yield (pipeline.deadline(),) + prev[1:]
+
+def replay(path, pipeline, context, speed=1.0, clock=None):
+    """
+    記録した入力を NotchPipeline (StableNotchReader → モードロジック) に流す
+    speed=1.0 なら記録時と同じ速さ、speed=None なら待たずに最速で流す。処理した件数を返す
+    """
+    if clock is None:
+        from timing import PerfClock
+        clock = PerfClock()
+    t0 = clock.now()
+    count = 0
+    for t, b_val, p_pat, mask, t_read in settle_points(read_trace(path), pipeline):
+        if speed is not None:
+            clock.sleep_until(t0 + t / speed)
+        pipeline.step(mask, mask_to_btns(mask), context, t, t_read)
+        count += 1
+    return count
+
+def main(argv):
+    """python input_trace.py 記録ファイル [ゲーム] [--fast] : 記録を再生し、送出されるはずのキー数を表示する"""
+    from backends import RecordingBackend
+    from output import KeyScheduler
+    from sampler import NotchPipeline
+    from simulate import LOGIC_CLASSES, default_context
+
+    args = [a for a in argv if not a.startswith('--')]
+    if not args:
+        print(main.__doc__)
+        return 1
+    game_mode = args[1] if len(args) > 1 else "JRETS"
+    speed = None if '--fast' in argv else 1.0
+
+    backend = RecordingBackend()
+    out = KeyScheduler(backend=backend)
+    logics = {name: cls(out) for name, cls in LOGIC_CLASSES.items()}
+    context = default_context(game_mode)
+    t = time.perf_counter()
+    count = replay(args[0], NotchPipeline(logics), context, speed)
+    elapsed = time.perf_counter() - t
+    while not out.is_idle(): time.sleep(0.01)
+    out.stop()
+    print(f"{count} samples in {elapsed:.3f} s ({count / elapsed if elapsed else 0:.0f} samples/s), "
+          f"{len(backend.events)} key events")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,20 +1,149 @@
 # inputs.py
+import time
+from array import array
+from itertools import compress
+
 import pygame
 
+from const import CONTROLLER_WIRINGS, CONTROLLER_WIRING
+
 class StableNotchReader:
-    """無効な入力(-1)を無視し、有効な値だけを即時反映するクラス"""
-    def __init__(self, init_val=0):
+    """
+    段数の読み取り値からノイズを除くクラス。無効な入力(-1)は無視する
+    ハンドルが段の間を通る時はビットが1本ずつずれて切り替わるため、一瞬だけ別の段
+    (N→B1 の途中の B2、B6→B7 の途中の EB など) が読めることがある。
+    code_map (ビットパターン → 段) を渡すと、確定中の段から隣の段へ動く途中に現れうる段を
+    「怪しい遷移」とし、settle_us (µs) の間その段が続いた時だけ確定させる (反対側の隣の段も含む)。
+    それ以外の値は従来どおり即時に確定する (遅らせるのは最大 settle_us まで)
+    """
+    def __init__(self, init_val=0, code_map=None, settle_us=0):
         self.confirmed = init_val
+        self.settle = settle_us / 1e6
+        self.suspects = _transient_table(code_map) if code_map and settle_us > 0 else {}
+        self.candidate = None # 保留中の怪しい段
+        self.since = 0.0      # candidate を最初に読んだ時刻
+        # 統計: 捨てた一瞬の段の数、保留の末に確定した数と、それで遅れた時間 (秒)
+        self.suppressed = 0
+        self.delayed = 0
+        self.delay_total = 0.0
+        self.delay_max = 0.0
 
-    def update(self, raw_val):
-        # 未定義(-1)の場合は直前の確定値を維持
+    @property
+    def deadline(self):
+        """保留中の段を確定させる時刻 (保留が無ければ None)"""
+        return None if self.candidate is None else self.since + self.settle
+
+    def update(self, raw_val, t=None):
+        if t is None: t = time.perf_counter()
+        # 未定義(-1)の場合は直前の確定値を維持 (保留中なら期限が来た時だけ確定させる)
         if raw_val == -1:
+            if self.candidate is not None and t >= self.deadline:
+                self._confirm(self.candidate, t)
             return self.confirmed
-        
-        # それ以外の有効な値は、即座に確定させる
-        self.confirmed = raw_val
+
+        if raw_val == self.confirmed:
+            if self.candidate is not None: # 元の段に戻った = 一瞬だけ読めた段だった
+                self.suppressed += 1
+                self.candidate = None
+            return raw_val
+
+        if raw_val in self.suspects.get(self.confirmed, ()):
+            if self.candidate is None: self.since = t
+            elif raw_val != self.candidate: self.suppressed += 1
+            self.candidate = raw_val
+            if t < self.deadline:
+                return self.confirmed
+        elif self.candidate is not None:
+            # 隣の段などに落ち着いた → 保留していた段は通過途中の読み違い
+            self.suppressed += 1
+            self.candidate = None
+
+        self._confirm(raw_val, t)
         return raw_val
 
+    def stats(self):
+        return {
+            "suppressed": self.suppressed,
+            "delayed": self.delayed,
+            "delay_mean": self.delay_total / self.delayed if self.delayed else 0.0,
+            "delay_max": self.delay_max
+        }
+
+    def _confirm(self, val, t):
+        if self.candidate is not None:
+            delay = t - self.since
+            self.delayed += 1
+            self.delay_total += delay
+            self.delay_max = max(self.delay_max, delay)
+            self.candidate = None
+        self.confirmed = val
+
+def _code_bits(code):
+    """ビットパターン (整数かビットのタプル) を整数にする"""
+    if isinstance(code, tuple):
+        bits = 0
+        for b in code: bits = (bits << 1) | b
+        return bits
+    return code
+
+def _transient_table(code_map):
+    """{段: その段から隣の段へ動く途中に一瞬読めうる、行き先以外の段の集合}"""
+    bits = {val: _code_bits(code) for code, val in code_map.items()}
+    table = {}
+    for val, code in bits.items():
+        found = set()
+        for nb in (val - 1, val + 1):
+            if nb not in bits: continue
+            moving = code ^ bits[nb] # 切り替わるビット。それ以外のビットは途中でも変わらない
+            for other, other_code in bits.items():
+                if other not in (val, nb) and (other_code ^ code) & ~moving == 0:
+                    found.add(other)
+        table[val] = frozenset(found)
+    return table
+
+class DecodeTable:
+    """
+    16ビットのボタンマスク → 段の変換表 (配線 (const.CONTROLLER_WIRINGS の1件) から一度だけ作り、以後は添字で引くだけにする)
+    codes[mask] はブレーキのビットパターンを下位に、マスコンのビットパターンをその上に詰めた値 (合わせて16ビットまで)
+    pairs[mask] は (raw_p, raw_b) で、対応表 (brake_map / mascon_map) に無いパターンは -1
+    """
+    def __init__(self, wiring):
+        brake, mascon = wiring['brake'], wiring['mascon']
+        self.brake_map = wiring['brake_map']
+        self.mascon_map = wiring['mascon_map']
+        self.brake_bits = len(brake)
+        self.brake_mask = (1 << self.brake_bits) - 1
+        # ボタン i+1 が押された時に立つビット
+        weights = [0] * 16
+        for pos, btn in enumerate(reversed(brake)): weights[btn - 1] |= 1 << pos
+        for pos, btn in enumerate(reversed(mascon)): weights[btn - 1] |= 1 << (pos + self.brake_bits)
+        # ★ボタン1つずつ表を倍に広げる (後半はそのボタンが押された側) ので、65536回のビット演算は要らない
+        codes = [0]
+        for w in weights: codes += [c | w for c in codes]
+        self.codes = array('H', codes)
+
+        n = len(mascon)
+        self.p_pats = [tuple((c >> (n - 1 - i)) & 1 for i in range(n)) for c in range(1 << n)]
+        pair_of = [(self.mascon_map.get(self.p_pats[c >> self.brake_bits], -1),
+                    self.brake_map.get(c & self.brake_mask, -1))
+                   for c in range(1 << (self.brake_bits + n))]
+        self.pairs = [pair_of[c] for c in codes]
+
+    def decode(self, mask):
+        """ボタンマスク → (b_val, p_pat)"""
+        code = self.codes[mask]
+        return code & self.brake_mask, self.p_pats[code >> self.brake_bits]
+
+_tables = {}
+_BUTTON_BITS = [1 << i for i in range(16)]
+
+def decode_table(wiring=CONTROLLER_WIRING):
+    """配線ごとの変換表 (初めて使う時に作り、以後は同じものを返す)"""
+    table = _tables.get(wiring)
+    if table is None:
+        table = _tables[wiring] = DecodeTable(CONTROLLER_WIRINGS[wiring])
+    return table
+
 def get_inputs(joy):
     """
     ジョイスティックから入力を取得し、ビットパターンに変換する
@@ -28,8 +157,66 @@ def get_inputs(joy):
     raw = [joy.get_button(i) for i in range(16)]
     btns = [None] + raw # 1-based indexに合わせるためのダミー
     
-    # 電車でGO!コントローラー特有のビット演算
-    b_val = (btns[6]<<3) | (btns[8]<<2) | (btns[5]<<1) | btns[7]
-    p_pat = (btns[14], btns[16], btns[1])
-    
-    return b_val, p_pat, btns
\ No newline at end of file
+    mask = sum(compress(_BUTTON_BITS, raw))
+    b_val, p_pat = decode_table().decode(mask)
+    return b_val, p_pat, btns
+
+class JoyState:
+    """
+    JOYBUTTONDOWN/UP イベントからボタン状態を整数のビットマスク (bit i-1 = ボタンi) で保持するクラス
+    毎フレーム16回 get_button を呼ぶ代わりに、イベントが来た時だけ b_val / p_pat を計算し直す
+    btns は get_inputs と同じ1始まりのリストで、変化した要素だけをその場で書き換える
+    b_val / p_pat への変換は table (DecodeTable、省略時は CONTROLLER_WIRING の配線) で引く
+    """
+    def __init__(self, joy=None, table=None):
+        self.joy = joy
+        self.table = table if table is not None else decode_table()
+        self.mask = 0
+        self.btns = [None] + [0] * 16
+        self.b_val = 0
+        self.p_pat = (0, 0, 0)
+        self.state = (0, 0, (0, 0, 0), 0.0) # (mask, b_val, p_pat, 変化した時刻) 別スレッドからはこれを1回で読む
+        self.listener = None # 状態が変わった時に呼ぶ関数 (入力スレッドを起こす用)
+        self.resync()
+
+    def resync(self):
+        """接続直後などに、全ボタンを1回だけ直接読んで状態を合わせる"""
+        mask = 0
+        if self.joy is not None:
+            # ★バックエンドによっては最初の pump まで get_button が全て0を返す
+            # (全ビット0は非常ブレーキと読めるので、そのまま同期するとロジックが非常から始まってしまう)
+            pygame.event.pump()
+            for i in range(16):
+                if self.joy.get_button(i): mask |= 1 << i
+        self._apply(mask)
+
+    def handle_event(self, event):
+        """ジョイスティックのイベントなら (ボタンは状態に反映して) True を返す"""
+        if event.type in (pygame.JOYAXISMOTION, pygame.JOYHATMOTION, pygame.JOYBALLMOTION):
+            return True # 軸・ハットは使わない (読み捨て)
+        if event.type in (pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP) and event.button >= 16:
+            return True # コントローラーに存在しないボタン番号は無視
+        if event.type == pygame.JOYBUTTONDOWN:
+            bit = 1 << event.button
+            if self.mask & bit: return True
+            self._apply(self.mask | bit)
+            return True
+        if event.type == pygame.JOYBUTTONUP:
+            bit = 1 << event.button
+            if not self.mask & bit: return True
+            self._apply(self.mask & ~bit)
+            return True
+        return False
+
+    def _apply(self, mask):
+        diff = mask ^ self.mask
+        self.mask = mask
+        btns = self.btns
+        i = 1
+        while diff:
+            if diff & 1: btns[i] = (mask >> (i - 1)) & 1
+            diff >>= 1
+            i += 1
+        self.b_val, self.p_pat = self.table.decode(mask)
+        self.state = (mask, self.b_val, self.p_pat, time.perf_counter())
+        if self.listener is not None: self.listener()
@@ -0,0 +1,116 @@
+# latency.py
+# ハンドル操作からキー送出までの遅延を段階ごとに計測する
+# 入力スレッド (NotchPipeline) が read/filter/logic を、送出スレッド (KeyScheduler) が emit_start/emit_end/total を記録する
+import threading
+from array import array
+
+from const import LATENCY_RING_SIZE, URGENT_LATENCY_BOUND
+from timing import PerfClock
+
+# 段階と、それぞれ何から何までの時間か
+STAGES = ('read', 'filter', 'logic', 'emit_start', 'emit_end', 'total')
+STAGE_LABELS = {
+    'read': "入力の変化 → 入力スレッドが拾う (保留した段は確定するまで)",
+    'filter': "→ StableNotchReader を通る",
+    'logic': "→ モードロジックが送るキーを決める",
+    'emit_start': "ジョブを積む → 送出開始 (キューの待ち)",
+    'emit_end': "送出開始 → 最後のキーを送る",
+    'total': "入力の変化 → 最後のキーを送る"
+}
+
+class LatencyTracer:
+    """
+    段階ごとに直近 size 件の所要時間 (秒) をリングバッファに持ち、p50/p99/最大を出す
+    1つの段階を書き込むスレッドは1つだけなのでロックは取らない (集計側は多少古い値を読んでもよい)
+    入力1件分の計測は begin() → mark() → end() で行い、その間に積まれたジョブには
+    origin() (入力の変化した時刻) が付く
+    """
+    def __init__(self, size=LATENCY_RING_SIZE, clock=None):
+        self.clock = clock if clock is not None else PerfClock()
+        self.size = size
+        self._rings = {stage: array('d', [0.0]) * size for stage in STAGES}
+        self._counts = dict.fromkeys(STAGES, 0)
+        self._local = threading.local() # 計測中の入力 (origin, 直前の段階の時刻) はスレッドごと
+
+    def record(self, stage, seconds):
+        i = self._counts[stage]
+        self._rings[stage][i % self.size] = seconds
+        self._counts[stage] = i + 1
+
+    # --- 入力1件分の計測 (入力スレッドから呼ぶ) ---
+    def begin(self, t_read, t_start=None):
+        """t_read は入力が変化した時刻、t_start はそれを処理し始めた時刻 (省略時は現在)"""
+        if t_start is None: t_start = self.clock.now()
+        self._local.origin = t_read
+        self._local.last = t_start
+        self.record('read', max(0.0, t_start - t_read))
+
+    def mark(self, stage):
+        now = self.clock.now()
+        self.record(stage, now - self._local.last)
+        self._local.last = now
+
+    def end(self):
+        self._local.origin = None
+
+    def origin(self):
+        """計測中の入力が変化した時刻 (計測中でなければ None)"""
+        return getattr(self._local, 'origin', None)
+
+    # --- 集計 ---
+    def samples(self, stage):
+        n = min(self._counts[stage], self.size)
+        return sorted(self._rings[stage][:n])
+
+    def stats(self):
+        """{段階: (件数, p50, p99, 最大)} を秒で返す"""
+        result = {}
+        for stage in STAGES:
+            vals = self.samples(stage)
+            if not vals:
+                result[stage] = (0, 0.0, 0.0, 0.0)
+                continue
+            n = len(vals)
+            result[stage] = (n, vals[n // 2], vals[min(n - 1, n * 99 // 100)], vals[-1])
+        return result
+
+    def dump(self, path, pulses=None, urgent=None):
+        """
+        集計結果と、段階ごとのヒストグラム (µs を2倍刻みの区間に分けた件数) をテキストで書き出す
+        pulses に押下幅の実測値 (昇順、KeyScheduler.pulse_samples) を渡すと、同じ形で末尾に書く
+        urgent に優先キーの送出遅延 (昇順、KeyScheduler.latency_samples) を渡すと、上限を超えた件数と一緒に書く
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            for stage, (n, p50, p99, worst) in self.stats().items():
+                f.write(f"{stage:10s} n={n:5d}  p50 {p50 * 1000:8.3f} ms  p99 {p99 * 1000:8.3f} ms  "
+                        f"max {worst * 1000:8.3f} ms  # {STAGE_LABELS[stage]}\n")
+                for upper, count in _histogram(self.samples(stage)):
+                    f.write(f"    <= {upper:9d} us: {count}\n")
+            if pulses:
+                n = len(pulses)
+                f.write(f"{'pulse':10s} n={n:5d}  min {pulses[0] * 1000:8.3f} ms  p50 {pulses[n // 2] * 1000:8.3f} ms  "
+                        f"max {pulses[-1] * 1000:8.3f} ms  # 実際に送れた押下幅 (keyDown → keyUp)\n")
+                for upper, count in _histogram(pulses):
+                    f.write(f"    <= {upper:9d} us: {count}\n")
+            if urgent:
+                n = len(urgent)
+                over = sum(1 for v in urgent if v > URGENT_LATENCY_BOUND)
+                f.write(f"{'urgent':10s} n={n:5d}  p50 {urgent[n // 2] * 1000:8.3f} ms  "
+                        f"p99 {urgent[min(n - 1, n * 99 // 100)] * 1000:8.3f} ms  max {urgent[-1] * 1000:8.3f} ms  "
+                        f"over {URGENT_LATENCY_BOUND * 1000:.0f} ms: {over}  # 非常・N のジョブを積む → 送出開始\n")
+                for upper, count in _histogram(urgent):
+                    f.write(f"    <= {upper:9d} us: {count}\n")
+
+def _histogram(vals):
+    """昇順の値 (秒) を上限 1, 2, 4, ... µs の区間に数える。空の区間は書かない"""
+    buckets = []
+    upper = 1
+    i = 0
+    while i < len(vals):
+        count = 0
+        while i < len(vals) and vals[i] * 1e6 <= upper:
+            count += 1
+            i += 1
+        if count: buckets.append((upper, count))
+        upper *= 2
+    return buckets
@@ -1,19 +1,23 @@
 # main.py
+import time
+T_BOOT = time.perf_counter() # 起動時間の計測用 (--startup-bench)
 import sys
 import os
 import ctypes
+import json
+import threading
 import pygame
-import pydirectinput
 
 from const import *
-from inputs import get_inputs, StableNotchReader
+from inputs import JoyState, decode_table
+from input_trace import TraceRecorder
+from latency import LatencyTracer, STAGES
 import ui 
-from ui import Button, draw_bar_gauge, draw_auto_brake_unit, draw_header_title
-
-from modes.jrets import JretsLogic
-from modes.bve import BveLogic
-from modes.pcsx2 import Pcsx2Logic
-from modes.rpcs3 import Rpcs3Logic
+from output import scheduler
+from sampler import NotchPipeline, InputSampler
+from ui import Button, DirtyWidget, draw_bar_gauge, draw_auto_brake_unit, draw_header_title
+from modes import LogicTable
+from watchdog import FrameWatchdog
 
 try:
     myappid = 'my.dengo.converter.v21.ux_improved'
@@ -21,7 +25,6 @@ try:
 except:
     pass
 os.environ["SDL_JOYSTICK_ALLOW_BACKGROUND_EVENTS"] = "1"
-pydirectinput.PAUSE = 0
 
 game_mode = "JRETS"
 brake_mode = "1"
@@ -35,15 +38,27 @@ keihan_mode = False
 mode_787 = False
 yokusoku_mode = False
 
-logics = {
-    "JRETS": JretsLogic(),
-    "BVE": BveLogic(),
-    "PCSX2": Pcsx2Logic(),
-    "RPCS3": Rpcs3Logic()
-}
+# ★各ゲームのロジックは初めて選ばれた時に読み込んで作る (起動時は選択中のゲームの分だけ)
+logics = LogicTable()
+# ★ロジックは入力スレッドで更新されるため、UI側からの reset() はこのロックを取って呼ぶ
+logic_lock = threading.Lock()
+
+# ★contextに mode_787 を追加
+def make_context():
+    return {
+        "game_mode": game_mode,
+        "brake_mode": brake_mode,
+        "max_power": max_power,
+        "max_brake": max_brake,
+        "midosuji_mode": midosuji_mode,
+        "ae100_mode": ae100_mode,
+        "keihan_mode": keihan_mode,
+        "mode_787": mode_787 
+    }
 
 def force_reset_state(*args):
-    logics[game_mode].reset()
+    with logic_lock:
+        logics[game_mode].reset()
     print(f"State Reset Executed for {game_mode}.")
 
 def toggle_game_mode(mouse_btn=1, *args):
@@ -53,6 +68,7 @@ def toggle_game_mode(mouse_btn=1, *args):
     next_idx = (idx + 1) % len(modes) if mouse_btn == 1 else (idx - 1) % len(modes)
     game_mode = modes[next_idx]
     
+    ui.invalidate_special_gauges()
     midosuji_mode = False
     ae100_mode = False
     keihan_mode = False
@@ -61,11 +77,13 @@ def toggle_game_mode(mouse_btn=1, *args):
     max_power = 5
     max_brake = 8
     brake_mode = "1"
-    logics[game_mode].reset()
+    with logic_lock:
+        logics[game_mode].reset()
 
 def toggle_brake_mode(*args):
     global brake_mode, midosuji_mode, ae100_mode, keihan_mode, mode_787, yokusoku_mode, max_power, max_brake
     if midosuji_mode or ae100_mode or keihan_mode or mode_787 or yokusoku_mode:
+        ui.invalidate_special_gauges()
         midosuji_mode = False
         ae100_mode = False
         keihan_mode = False
@@ -76,11 +94,13 @@ def toggle_brake_mode(*args):
         brake_mode = "1"
     else:
         brake_mode = "2" if brake_mode == "1" else "1"
-    logics[game_mode].reset()
+    with logic_lock:
+        logics[game_mode].reset()
 
 def toggle_yokusoku(*args):
     global yokusoku_mode
     yokusoku_mode = not yokusoku_mode
+    if not yokusoku_mode: ui.invalidate_gauges(is_yokusoku=True)
 
 def toggle_midosuji(*args):
     global midosuji_mode, brake_mode, max_power, max_brake, ae100_mode, keihan_mode, mode_787
@@ -90,6 +110,7 @@ def toggle_midosuji(*args):
         brake_mode = "2"; max_power = 4; max_brake = 6
     else:
         midosuji_mode = False
+        ui.invalidate_gauges(is_midosuji=True) # 解除したモードのゲージだけ捨てる
 
 def toggle_ae100(*args):
     global ae100_mode, midosuji_mode, brake_mode, max_power, max_brake, keihan_mode, mode_787
@@ -99,6 +120,7 @@ def toggle_ae100(*args):
         brake_mode = "1"; max_power = 5; max_brake = 5
     else:
         ae100_mode = False
+        ui.invalidate_gauges(is_ae100=True)
 
 def toggle_keihan(*args):
     global keihan_mode, ae100_mode, midosuji_mode, brake_mode, max_power, max_brake, mode_787
@@ -108,6 +130,7 @@ def toggle_keihan(*args):
         brake_mode = "1"; max_power = 5; max_brake = 8
     else:
         keihan_mode = False
+        ui.invalidate_gauges(is_keihan=True)
 
 # ★追加: 787系モード切替
 def toggle_787(*args):
@@ -140,13 +163,6 @@ def dec_b(*args):
     if midosuji_mode or ae100_mode or keihan_mode or mode_787: return
     max_brake = max(1, max_brake - 1)
 
-def resource_path(relative_path):
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
-
 # これ追加!!!
 def get_dynamic_height(game_mode, brake_mode, max_power, max_brake):
     box_h, spacing = 34, 6
@@ -169,35 +185,84 @@ def get_dynamic_height(game_mode, brake_mode, max_power, max_brake):
     req_h = max(p_height, b_height) + bottom_margin
     return max(req_h, 0)
 
-def main():
-    pygame.init()
-    pygame.display.set_caption("DenGo Controller Converter")
-    icon_path = resource_path("DenGo-Controller-Converter.ico")
-    if os.path.exists(icon_path):
-        icon = pygame.image.load(icon_path)
-        pygame.display.set_icon(icon)
+def draw_raw_debug(surface, b_val, p_pat, game_mode):
+    """画面下端のRAW入力表示を描き、描いた範囲を返す"""
+    b_bits = tuple((b_val >> i) & 1 for i in reversed(range(decode_table().brake_bits)))
+    b_fmt_str = f"B={b_bits}"
+    dbg_str = f"RAW: P={p_pat} {b_fmt_str} GAME={game_mode}"
+    dbg = ui.render_text('ui_label', dbg_str, (80, 80, 80))
     
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    pygame.display.set_caption("DenGo Controller Converter")
-    
-    try:
-        base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
-        icon_path = os.path.join(base_path, "DenGo-Controller-Converter.png")
-        if os.path.exists(icon_path):
-            pygame.display.set_icon(pygame.image.load(icon_path))
-    except:
-        pass
+    # ★ 修正: SCREEN_HEIGHT ではなく、現在の screen.get_height() の下端に追従させる
+    return surface.blit(dbg, (20, surface.get_height() - 30))
+
+def draw_latency_overlay(surface, stats, urgent):
+    """
+    ハンドル操作→キー送出の各段階の遅延 (p50/p99/最大) を画面中央に重ねて描き、描いた範囲を返す
+    urgent は優先キー (非常・N) の送出遅延 (KeyScheduler.latency_stats)。最大が URGENT_LATENCY_BOUND を超えたら赤で描く
+    """
+    line_h = 22
+    box = pygame.Rect(220, 180, 360, (len(STAGES) + 2) * line_h + 10)
+    pygame.draw.rect(surface, COLOR_HEADER_BG, box)
+    pygame.draw.rect(surface, (80, 80, 80), box, 1)
+    lines = ["遅延 (ms)     p50     p99     max"]
+    for stage in STAGES:
+        _, p50, p99, worst = stats[stage]
+        lines.append(f"{stage:10s} {p50 * 1000:7.1f} {p99 * 1000:7.1f} {worst * 1000:7.1f}")
+    _, p50, p99, worst = urgent
+    lines.append(f"{'urgent':10s} {p50 * 1000:7.1f} {p99 * 1000:7.1f} {worst * 1000:7.1f}")
+    for i, line in enumerate(lines):
+        color = COLOR_ACCENT if i == 0 else COLOR_TEXT
+        if i == len(lines) - 1 and worst > URGENT_LATENCY_BOUND: color = COLOR_B_EMG
+        lbl = ui.render_text('ui_label', line, color)
+        surface.blit(lbl, (box.x + 10, box.y + 5 + i * line_h))
+    return box
 
-    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
-    clock = pygame.time.Clock()
-    ui.init_fonts()
+def main():
+    startup_bench = '--startup-bench' in sys.argv
+    # ★起動を速くするため、使うサブシステム (画面・フォント・ジョイスティック) だけを初期化する
+    # 入力スレッドを先に動かし、ウィンドウを作っている間にもハンドル操作を受け付ける
+    pygame.display.init()
+    pygame.font.init()
 
     pygame.joystick.init()
     joy = pygame.joystick.Joystick(0) if pygame.joystick.get_count() > 0 else None
     if joy: joy.init()
+    joy_state = JoyState(joy)
+
+    # ★フィルタ・ロジック更新は入力スレッドで INPUT_POLL_HZ 周期で回す
+    # 表示が変わったら入力スレッドから SNAPSHOT_EVENT を投げてメインループを起こす
+    SNAPSHOT_EVENT = pygame.event.custom_type()
+    # ★ハンドル操作→キー送出の遅延計測 (F3 で表示、F4 で LATENCY_DUMP_PATH へ書き出し)
+    tracer = LatencyTracer()
+    scheduler.tracer = tracer
+    sampler = InputSampler(joy_state, NotchPipeline(logics, tracer), make_context(), logic_lock,
+                           on_snapshot=lambda: pygame.event.post(pygame.event.Event(SNAPSHOT_EVENT)))
+    sampler.start()
+    # ★メインループが WATCHDOG_BUDGET を超えて止まったら、どこで止まっていたかを WATCHDOG_REPORT_PATH に書き出す
+    # (logic_lock 待ちで止まった時のために、入力スレッド・送出スレッドのスタックも一緒に採る)
+    watchdog = FrameWatchdog(thread_names=("InputSampler", "KeyScheduler"))
+    watchdog.start()
+
+    # ★ウィンドウは最初から今の設定に合った高さで1回だけ作る (アイコンは作る前に設定する)
+    pygame.display.set_caption("DenGo Controller Converter")
+    base_path = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+    for icon_name in ("DenGo-Controller-Converter.png", "DenGo-Controller-Converter.ico"):
+        icon_path = os.path.join(base_path, icon_name)
+        if os.path.exists(icon_path):
+            try:
+                pygame.display.set_icon(pygame.image.load(icon_path))
+                break
+            except pygame.error:
+                pass
+    screen = pygame.display.set_mode((SCREEN_WIDTH, get_dynamic_height(game_mode, brake_mode, max_power, max_brake)))
+    clock = pygame.time.Clock()
+    ui.init_fonts()
 
-    mascon_filter = StableNotchReader(0)
-    brake_filter = StableNotchReader(0)
+    # ★入力の記録 (不具合の再現・ベンチマーク用。input_trace.py で再生できる)
+    trace_rec = None
+    if INPUT_TRACE_PATH:
+        trace_rec = TraceRecorder(INPUT_TRACE_PATH)
+        trace_rec.attach(joy_state)
 
     header_h, label_y, val_y, gauge_start_y = 70, 90, 120, 180
     mascon_cx, elec_brake_cx = MARGIN_SIDE + 50, SCREEN_WIDTH - MARGIN_SIDE - 50
@@ -216,22 +281,81 @@ def main():
 
     offset_btn = 40
     btns_cfg = [
-        Button(mascon_cx - offset_btn - 14, val_y + 10, 24, 24, "－", dec_p, font_key='arrow'), 
-        Button(mascon_cx + offset_btn - 9, val_y + 10, 24, 24, "＋", inc_p, font_key='arrow'),
-        Button(elec_brake_cx - offset_btn - 14, val_y + 10, 24, 24, "－", dec_b, font_key='arrow'),
-        Button(elec_brake_cx + offset_btn - 9, val_y + 10, 24, 24, "＋", inc_b, font_key='arrow'),
+        Button(mascon_cx - offset_btn - 14, val_y + 10, 24, 24, "－", dec_p, font_key='arrow', bg_color=COLOR_BG), 
+        Button(mascon_cx + offset_btn - 9, val_y + 10, 24, 24, "＋", inc_p, font_key='arrow', bg_color=COLOR_BG),
+        Button(elec_brake_cx - offset_btn - 14, val_y + 10, 24, 24, "－", dec_b, font_key='arrow', bg_color=COLOR_BG),
+        Button(elec_brake_cx + offset_btn - 9, val_y + 10, 24, 24, "＋", inc_b, font_key='arrow', bg_color=COLOR_BG),
     ]
 
     all_btns = [btn_brake_mode, btn_game_mode, btn_reset, btn_midosuji, btn_ae100, btn_keihan, btn_787, btn_yokusoku] + btns_cfg
 
-    last_visual_state = None
+    # 部分描画の部品 (ボタンは各 Button が自分の DirtyWidget を持つ)
+    mascon_widget = DirtyWidget()
+    brake_widget = DirtyWidget()
+    dbg_widget = DirtyWidget()
+    latency_widget = DirtyWidget()
+    widgets = [mascon_widget, brake_widget, dbg_widget, latency_widget] + [b.dirty for b in all_btns]
+    latency_overlay = False
+    next_latency = 0.0
+    t_first_frame = None
+
+    last_layout_key = None
+    last_snapshot = None
+    ui_dirty = True
+    frame_interval = 1.0 / FPS
+    next_frame = 0.0
 
     running = True
     while running:
-        for event in pygame.event.get():
+        watchdog.idle() # イベント待ちで眠っている間は止まっているとみなさない
+        if IDLE_WAIT_MODE:
+            # ★省電力モード: イベント (ジョイスティック・マウス・入力スレッドからの再描画要求) が
+            # 来るまで眠る。描画待ちがある時だけ次の描画時刻で起きる
+            if ui_dirty or sampler.snapshot is not last_snapshot:
+                wait_ms = max(1, int((next_frame - time.perf_counter()) * 1000))
+            else:
+                wait_ms = IDLE_WAIT_TIMEOUT_MS
+            first = pygame.event.wait(wait_ms)
+            events = pygame.event.get()
+            if first.type != pygame.NOEVENT: events.insert(0, first)
+        else:
+            events = pygame.event.get()
+
+        watchdog.begin('events')
+        had_ui_event = False
+        for event in events:
+            if joy_state.handle_event(event): continue
+            if event.type == SNAPSHOT_EVENT: continue # 起こすためだけのイベント
+            had_ui_event = True
             if event.type == pygame.QUIT: running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                latency_overlay = not latency_overlay
+                last_layout_key = None # 消す時は下に隠れた部品ごと描き直す
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                tracer.dump(LATENCY_DUMP_PATH, scheduler.pulse_samples(), scheduler.latency_samples())
+                print(f"Latency stats written to {LATENCY_DUMP_PATH}")
             for btn in all_btns:
                 btn.handle_event(event)
+        if had_ui_event:
+            # 設定変更・リセットがあった時だけ入力スレッドへ反映する (マウス移動などでは起こさない)
+            ctx = make_context()
+            if ctx != sampler.context or logics[game_mode].needs_sync:
+                sampler.set_context(ctx)
+            ui_dirty = True
+
+        # ★描画は FPS 周期で十分。その間の周回はイベントの汲み上げ (=入力の読み取り) だけ行う
+        # 入力もUIイベントも無ければ、再描画の判定ごと省略する
+        now = time.perf_counter()
+        snapshot = sampler.snapshot
+        if latency_overlay and now >= next_latency:
+            ui_dirty = True # 遅延の表示は入力が無くても一定間隔で更新する
+        if now < next_frame or (not ui_dirty and snapshot is last_snapshot):
+            if not IDLE_WAIT_MODE: clock.tick(INPUT_POLL_HZ)
+            continue
+        next_frame = now + frame_interval
+        ui_dirty = False
+        watchdog.mark('layout')
+        last_snapshot = snapshot
         
         # 特殊モードボタンの出現条件
         btn_midosuji.visible = (game_mode == "PCSX2") and (midosuji_mode or max_brake == 6)
@@ -269,39 +393,18 @@ def main():
         if yokusoku_mode: btn_yokusoku.text = "抑速"; btn_yokusoku.base_color = COLOR_B_SVC
         else: btn_yokusoku.text = "通常"; btn_yokusoku.base_color = COLOR_NORMAL_BTN
 
-        b_val, p_pat, raw_btns = get_inputs(joy)
-        
-        if game_mode in ["PCSX2", "RPCS3"]:
-             raw_b = ELECTRIC_BRAKE_MAP.get(b_val, -1)
-        else:
-             raw_b = ELECTRIC_BRAKE_MAP.get(b_val, -1) if brake_mode == "1" else AUTO_BRAKE_MAP.get(b_val, -1)
-        
-        raw_p = MASCON_LEVEL_MAP.get(p_pat, -1)
-
-        cur_p = min(mascon_filter.update(raw_p), max_power)
-        cur_b = brake_filter.update(raw_b)
-        
-        if game_mode in ["PCSX2", "RPCS3"]:
-             if cur_b == 14: display_b = max_brake + 1
-             elif midosuji_mode and cur_b > max_brake: display_b = max_brake
-             else: display_b = min(cur_b, max_brake)
-        elif brake_mode == "1":
-             if cur_b == 14: display_b = max_brake + 1
-             else: display_b = min(cur_b, max_brake)
-        else:
-             display_b = cur_b 
-        display_p = 0 if display_b > 0 else cur_p
+        display_p, display_b, b_val, p_pat = snapshot
 
-        current_visual_state = (
+        # ★部分描画: 画面構成 (モード・段数設定) が変わった時だけ全体を描き直し、
+        # それ以外は変化した部品 (ゲージ・ボタン・RAW表示) の領域だけを転送する
+        layout_key = (
             game_mode, brake_mode, 
             max_power, max_brake,
-            midosuji_mode, ae100_mode, keihan_mode, mode_787, yokusoku_mode,
-            display_p, display_b,
-            tuple(b.hover for b in all_btns if b.visible),
-            b_val, p_pat
+            midosuji_mode, ae100_mode, keihan_mode, mode_787, yokusoku_mode
         )
+        full_redraw = (layout_key != last_layout_key)
 
-        if current_visual_state != last_visual_state:
+        if full_redraw:
             # ★ 追加: ウィンドウの伸縮処理
             req_h = get_dynamic_height(game_mode, brake_mode, max_power, max_brake)
             if screen.get_height() != req_h:
@@ -314,61 +417,70 @@ def main():
             draw_header_title(screen, game_mode, brake_mode, midosuji_mode, ae100_mode, keihan_mode, mode_787, header_h)
 
             # --- マスコン段数の文字 ---
-            lbl_p_t = ui.fonts['ui_label'].render("マスコン段数", True, COLOR_TEXT_DIM)
+            lbl_p_t = ui.render_text('ui_label', "マスコン段数", COLOR_TEXT_DIM)
             screen.blit(lbl_p_t, lbl_p_t.get_rect(center=(mascon_cx, label_y + 10)))
             
             # マスコンは最大5段
-            lbl_p_v = ui.fonts['val'].render(f"{max_power}段", True, COLOR_TEXT)
+            lbl_p_v = ui.render_text('val', f"{max_power}段", COLOR_TEXT)
             screen.blit(lbl_p_v, lbl_p_v.get_rect(midright=(mascon_cx + 24, val_y + 22))) # 座標はキープ！
 
             # --- ブレーキ段数の文字 ---
             if not is_real_auto_air:
-                lbl_b_t = ui.fonts['ui_label'].render("ブレーキ段数", True, COLOR_TEXT_DIM)
+                lbl_b_t = ui.render_text('ui_label', "ブレーキ段数", COLOR_TEXT_DIM)
                 screen.blit(lbl_b_t, lbl_b_t.get_rect(center=(elec_brake_cx, label_y + 10)))
                 
                 # 10段以上の時は val_small を使ってUIを整える
-                b_font = ui.fonts['val_small'] if max_brake >= 10 else ui.fonts['val']
+                b_font = 'val_small' if max_brake >= 10 else 'val'
                 b_offset_x = 2 if max_brake >= 10 else 0
-                lbl_b_v = b_font.render(f"{max_brake}段", True, COLOR_TEXT)
+                lbl_b_v = ui.render_text(b_font, f"{max_brake}段", COLOR_TEXT)
                 screen.blit(lbl_b_v, lbl_b_v.get_rect(midright=(elec_brake_cx + 24 + b_offset_x, val_y + 22)))
 
-            draw_bar_gauge(screen, mascon_cx, gauge_start_y, display_p, max_power, True, is_ae100=ae100_mode, is_keihan=keihan_mode)
-            
-            if not is_real_auto_air:
-                draw_bar_gauge(screen, elec_brake_cx, gauge_start_y, display_b, max_brake, False, is_midosuji=midosuji_mode, is_keihan=keihan_mode, is_yokusoku=yokusoku_mode)
-            else:
-                auto_cx = (SCREEN_WIDTH - MARGIN_SIDE) - 40 - (180 * 0.94) 
-                draw_auto_brake_unit(screen, int(auto_cx), 193, display_b)
+            # 全体を描き直したので、各部品は次の redraw で必ず描かせる
+            for w in widgets: w.invalidate()
+            last_layout_key = layout_key
 
-            for btn in all_btns:
-                if btn.visible: btn.draw(screen)
+        watchdog.mark('draw')
+        dirty_rects = [mascon_widget.redraw(screen, display_p, draw_bar_gauge, mascon_cx, gauge_start_y, display_p, max_power, True, is_ae100=ae100_mode, is_keihan=keihan_mode)]
+        
+        if not is_real_auto_air:
+            dirty_rects.append(brake_widget.redraw(screen, display_b, draw_bar_gauge, elec_brake_cx, gauge_start_y, display_b, max_brake, False, is_midosuji=midosuji_mode, is_keihan=keihan_mode, is_yokusoku=yokusoku_mode))
+        else:
+            auto_cx = (SCREEN_WIDTH - MARGIN_SIDE) - 40 - (180 * 0.94) 
+            dirty_rects.append(brake_widget.redraw(screen, display_b, draw_auto_brake_unit, int(auto_cx), 193, display_b))
 
-            b_bits = [(b_val >> 3) & 1, (b_val >> 2) & 1, (b_val >> 1) & 1, b_val & 1]
-            b_fmt_str = f"B=({b_bits[0]}, {b_bits[1]}, {b_bits[2]}, {b_bits[3]})"
-            dbg_str = f"RAW: P={p_pat} {b_fmt_str} GAME={game_mode}"
-            dbg = ui.fonts['ui_label'].render(dbg_str, True, (80, 80, 80))
-            
-            # ★ 修正: SCREEN_HEIGHT ではなく、現在の screen.get_height() の下端に追従させる
-            screen.blit(dbg, (20, screen.get_height() - 30))
+        for btn in all_btns:
+            dirty_rects.append(btn.redraw(screen))
 
-            pygame.display.flip()
-            last_visual_state = current_visual_state
-
-        # ★contextに mode_787 を追加
-        context = {
-            "game_mode": game_mode,
-            "brake_mode": brake_mode,
-            "max_power": max_power,
-            "max_brake": max_brake,
-            "midosuji_mode": midosuji_mode,
-            "ae100_mode": ae100_mode,
-            "keihan_mode": keihan_mode,
-            "mode_787": mode_787 
-        }
-        logics[game_mode].update(cur_p, cur_b, raw_btns, context)
-        
-        clock.tick(FPS)
+        dirty_rects.append(dbg_widget.redraw(screen, (b_val, p_pat), draw_raw_debug, b_val, p_pat, game_mode))
+
+        if latency_overlay:
+            # ゲージの上に重ねて描くので、下の部品が描き直されても消えないよう毎回描く
+            latency_widget.invalidate()
+            dirty_rects.append(latency_widget.redraw(screen, now, draw_latency_overlay, tracer.stats(), scheduler.latency_stats()))
+            next_latency = now + LATENCY_OVERLAY_INTERVAL
 
+        watchdog.mark('present')
+        if full_redraw:
+            pygame.display.flip()
+        else:
+            rects = [r for r in dirty_rects if r is not None]
+            if rects: pygame.display.update(rects)
+
+        if t_first_frame is None:
+            t_first_frame = time.perf_counter()
+            watchdog.mark('prepare')
+            scheduler.prepare() # ★キーの送出先 (pydirectinput) は最初の画面を出してから読み込む
+        if startup_bench and sampler.t_ready is not None:
+            # bench_startup.py 用: 各時刻を出して終了する
+            print("STARTUP " + json.dumps({"boot": T_BOOT, "first_frame": t_first_frame, "input_ready": sampler.t_ready}))
+            running = False
+
+        if not IDLE_WAIT_MODE: clock.tick(INPUT_POLL_HZ)
+
+    watchdog.stop()
+    sampler.stop()
+    if trace_rec is not None: trace_rec.close()
+    scheduler.stop() # 未送信のキーを破棄し、押しっぱなしのキーを離す
     pygame.quit()
 
 if __name__ == "__main__":
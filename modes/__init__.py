@@ -0,0 +1,40 @@
+# modes/__init__.py
+import importlib
+import threading
+
+# ゲーム名 → (モジュール, クラス名)。ロジックは使う時に初めて import する (起動を速くするため)
+LOGIC_MODULES = {
+    "JRETS": ("modes.jrets", "JretsLogic"),
+    "BVE": ("modes.bve", "BveLogic"),
+    "PCSX2": ("modes.pcsx2", "Pcsx2Logic"),
+    "RPCS3": ("modes.rpcs3", "Rpcs3Logic")
+}
+
+def default_context(game_mode):
+    """main.make_context() と同じ形の初期設定"""
+    return {
+        "game_mode": game_mode,
+        "brake_mode": "1",
+        "max_power": 5,
+        "max_brake": 8,
+        "midosuji_mode": False,
+        "ae100_mode": False,
+        "keihan_mode": False,
+        "mode_787": False
+    }
+
+def logic_class(game_mode):
+    module, name = LOGIC_MODULES[game_mode]
+    return getattr(importlib.import_module(module), name)
+
+class LogicTable(dict):
+    """{ゲーム名: ロジック} の辞書。まだ作っていないゲームのロジックは初めて引いた時に作る"""
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock() # UI と入力スレッドが同時に引いても1つしか作らない
+
+    def __missing__(self, game_mode):
+        with self._lock:
+            if game_mode not in self:
+                dict.__setitem__(self, game_mode, logic_class(game_mode)())
+            return dict.__getitem__(self, game_mode)
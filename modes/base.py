@@ -1,6 +1,10 @@
 # modes/base.py
+from output import scheduler
+
 class BaseLogic:
-    def __init__(self):
+    def __init__(self, out=None):
+        # キー送出先 (指定がなければ全モード共通の送出キュー)
+        self.out = out if out is not None else scheduler
         self.prev_p = 0
         self.prev_b = 0
         # ボタン状態管理
@@ -10,9 +14,39 @@ class BaseLogic:
 
     def reset(self):
         """状態を強制リセットする時に呼ぶ"""
+        self.out.cancel() # 送出待ちのノッチ操作は全て破棄
         self.prev_p = 0
         self.prev_b = 0
         self.needs_sync = True # リセット時に同期フラグを立てる
 
     def update(self, cur_p, cur_b, raw_btns, context):
-        pass
\ No newline at end of file
+        pass
+
+    # --- キー送出ヘルパー ---
+    # state には「このキーを送り終えた時点の自身の状態」を渡す (例: prev_axis=3)
+    # urgent=True は非常ブレーキ・Nショートカット用 (通常の段送りより先に送出される)
+    def press(self, key, settle=0, urgent=False, **state):
+        self.out.press(key, self, state or None, settle, urgent)
+
+    def press_emu(self, key, settle=0, urgent=False, **state):
+        # 押下幅・解放待ちは送出スレッド側で待つ (メインループは止めない)
+        self.out.press_emu(key, self, state or None, settle, urgent)
+
+    def cancel_pending(self):
+        """未送信のノッチ操作を破棄し、ゲーム側が実際に到達する状態まで巻き戻す"""
+        for name, val in self.out.cancel(self).items():
+            setattr(self, name, val)
+
+    def follow_plan(self, steps, name='prev_axis', emu=True):
+        """planner の手順 (キー, 到達値, 優先か, 待ち) を順に積み、各段の到達値を状態 name として記録する"""
+        send = self.press_emu if emu else self.press
+        for key, val, urgent, settle in steps:
+            send(key, settle=settle, urgent=urgent, **{name: val})
+
+    def step_to(self, key, name, start, goal, emu=False):
+        """key を1段ずつ押して、状態 name を start から goal まで進める (各段の到達値を記録)"""
+        if goal == start: return
+        d = 1 if goal > start else -1
+        send = self.press_emu if emu else self.press
+        for v in range(start + d, goal + d, d):
+            send(key, **{name: v})
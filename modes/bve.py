@@ -1,11 +1,11 @@
 # modes/bve.py
-import pydirectinput
 from const import *
 from .base import BaseLogic
+from .planner import pc_plan
 
 class BveLogic(BaseLogic):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, out=None):
+        super().__init__(out)
         self.auto_state = 0 
 
     def reset(self):
@@ -38,80 +38,57 @@ class BveLogic(BaseLogic):
             return
         # ---------------------------
 
+        # ★ハンドルが再び動いたら未送信の段送りを捨て、ゲーム側の到達位置から差分だけ送り直す
+        if cur_p != self.prev_p or cur_b != (self.auto_state if brake_mode == "2" else self.prev_b):
+            self.cancel_pending()
+
         if cur_b <= 0:
             if brake_mode == "2":
                 target_state = 0
                 if self.auto_state != 0:
-                    diff = target_state - self.auto_state
-                    for _ in range(abs(diff)):
-                        pydirectinput.press(KEY_BRAKE_DOWN)
+                    self.step_to(KEY_BRAKE_DOWN, 'auto_state', self.auto_state, target_state)
                     self.auto_state = 0
             
+            # ★N・緩解・非常キーで飛んでから段を戻す方が押す回数が少なければそちらを使う (planner)
             if brake_mode == "1" and self.prev_b > 0:
-                steps_to_release = self.prev_b
-                for _ in range(steps_to_release):
-                    pydirectinput.press(KEY_BRAKE_DOWN)
+                self.follow_plan(pc_plan('brake', self.prev_b, 0, max_brake), 'prev_b', emu=False)
                 self.prev_b = 0
 
             if cur_p != self.prev_p:
-                diff = cur_p - self.prev_p
-                if diff > 0:
-                    for _ in range(diff): 
-                        pydirectinput.press(KEY_MASCON_UP)
-                elif diff < 0:
-                    for _ in range(abs(diff)): 
-                        pydirectinput.press(KEY_MASCON_DOWN)
+                self.follow_plan(pc_plan('mascon', self.prev_p, cur_p), 'prev_p', emu=False)
                 self.prev_p = cur_p
 
         else:
             if self.prev_p != 0:
-                diff = 0 - self.prev_p
-                for _ in range(abs(diff)): 
-                    pydirectinput.press(KEY_MASCON_DOWN)
+                self.follow_plan(pc_plan('mascon', self.prev_p, 0), 'prev_p', emu=False)
                 self.prev_p = 0
             
             if brake_mode == "2":
                 target_state = cur_b
                 
                 if target_state == 3 and self.auto_state != 3:
-                    pydirectinput.press(KEY_BRAKE_EMG)
+                    self.press(KEY_BRAKE_EMG, urgent=True, auto_state=3)
                     self.auto_state = 3
                 elif target_state != 3 and self.auto_state == 3:
-                    pydirectinput.press(KEY_BRAKE_DOWN)
+                    self.press(KEY_BRAKE_DOWN, auto_state=2)
                     self.auto_state = 2
                 
                 if target_state != 3 and self.auto_state != 3:
                     if target_state != self.auto_state:
                         diff = target_state - self.auto_state
-                        if diff > 0: 
-                             for _ in range(diff): 
-                                 pydirectinput.press(KEY_BRAKE_UP)
-                        elif diff < 0: 
-                             for _ in range(abs(diff)): 
-                                 pydirectinput.press(KEY_BRAKE_DOWN)
+                        key = KEY_BRAKE_UP if diff > 0 else KEY_BRAKE_DOWN
+                        self.step_to(key, 'auto_state', self.auto_state, target_state)
                         self.auto_state = target_state
             
             else:
                 if cur_b != self.prev_b:
-                    if cur_b == max_brake + 1:
-                        pydirectinput.press(KEY_BRAKE_EMG)
-                    elif self.prev_b == max_brake + 1:
-                        pydirectinput.press(KEY_BRAKE_DOWN)
-                        self.prev_b = max_brake
-                        diff = cur_b - self.prev_b
-                        for _ in range(abs(diff)):
-                            pydirectinput.press(KEY_BRAKE_DOWN)
-                    else:
-                        diff = cur_b - self.prev_b
-                        key = KEY_BRAKE_UP if diff > 0 else KEY_BRAKE_DOWN
-                        for _ in range(abs(diff)):
-                            pydirectinput.press(key)
+                    self.follow_plan(pc_plan('brake', self.prev_b, cur_b, max_brake), 'prev_b', emu=False)
                     self.prev_b = cur_b
 
         is_st, is_sl = (raw_btns[9]==1), (raw_btns[10]==1)
         if is_st != self.p_start: 
-            pydirectinput.keyDown(KEY_START_BVE) if is_st else pydirectinput.keyUp(KEY_START_BVE)
+            self.out.key_down(KEY_START_BVE) if is_st else self.out.key_up(KEY_START_BVE)
             self.p_start = is_st
         if is_sl != self.p_select: 
-            pydirectinput.keyDown(KEY_SELECT) if is_sl else pydirectinput.keyUp(KEY_SELECT)
+            self.out.key_down(KEY_SELECT) if is_sl else self.out.key_up(KEY_SELECT)
             self.p_select = is_sl
\ No newline at end of file
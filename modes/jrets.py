@@ -1,17 +1,17 @@
 # modes/jrets.py
-import pydirectinput
 from const import *
 from .base import BaseLogic
+from .planner import pc_plan
 
 class JretsLogic(BaseLogic):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, out=None):
+        super().__init__(out)
         self.last_auto_s = 0
 
     def reset(self):
         super().reset()
         self.last_auto_s = 0
-        pydirectinput.keyUp(KEY_BRAKE_UP)
+        self.out.key_up(KEY_BRAKE_UP)
 
     def update(self, raw_p, raw_b, raw_btns, context):
         brake_mode = context.get('brake_mode', '1')
@@ -40,6 +40,10 @@ class JretsLogic(BaseLogic):
             return # 初回はここで終了（キー送信しない）
         # ---------------------------
 
+        # ★ハンドルが再び動いたら未送信の段送りを捨て、ゲーム側の到達位置から差分だけ送り直す
+        if cur_p != self.prev_p or cur_b != (self.last_auto_s if brake_mode == "2" else self.prev_b):
+            self.cancel_pending()
+
         target_brake_s = 0
         is_logical_run = False
 
@@ -51,47 +55,36 @@ class JretsLogic(BaseLogic):
 
         if is_logical_run:
             if brake_mode == "1" and self.prev_b > 0:
-                pydirectinput.press(KEY_BRAKE_N)
+                self.press(KEY_BRAKE_N, prev_b=0)
                 self.prev_b = 0
 
             if cur_p != self.prev_p:
-                if cur_p == 0:
-                    pydirectinput.press(KEY_MASCON_N)
-                else:
-                    diff = cur_p - self.prev_p
-                    key = KEY_MASCON_UP if diff > 0 else KEY_MASCON_DOWN
-                    for _ in range(abs(diff)):
-                        pydirectinput.press(key)
+                # ★N に戻してから上げ直す方が押す回数が少なければそちらを使う (planner)
+                self.follow_plan(pc_plan('mascon', self.prev_p, cur_p), 'prev_p', emu=False)
                 self.prev_p = cur_p
         else:
             if self.prev_p != 0:
-                pydirectinput.press(KEY_MASCON_N)
+                self.press(KEY_MASCON_N, urgent=True, prev_p=0)
                 self.prev_p = 0
 
         if brake_mode == "2":
             if target_brake_s != self.last_auto_s:
-                pydirectinput.keyUp(KEY_BRAKE_UP)
-                if target_brake_s == 0: pydirectinput.press(KEY_BRAKE_N)
-                elif target_brake_s == 2: pydirectinput.keyDown(KEY_BRAKE_UP)
-                elif target_brake_s == 3: pydirectinput.press(KEY_BRAKE_EMG)
+                # ★非常の時は . の解放も優先キューで先に送る (. を押したまま / が届かないように)
+                self.out.key_up(KEY_BRAKE_UP, urgent=(target_brake_s == 3))
+                if target_brake_s == 0: self.press(KEY_BRAKE_N, last_auto_s=0)
+                elif target_brake_s == 2: self.out.key_down(KEY_BRAKE_UP, self, {'last_auto_s': 2})
+                elif target_brake_s == 3: self.press(KEY_BRAKE_EMG, urgent=True, last_auto_s=3)
                 self.last_auto_s = target_brake_s
         else:
             if cur_b != self.prev_b:
-                if cur_b == max_brake + 1:
-                    pydirectinput.press(KEY_BRAKE_EMG)
-                elif cur_b == 0:
-                    pydirectinput.press(KEY_BRAKE_N)
-                else:
-                    diff = cur_b - self.prev_b
-                    key = KEY_BRAKE_UP if diff > 0 else KEY_BRAKE_DOWN
-                    for _ in range(abs(diff)):
-                        pydirectinput.press(key)
+                # ★緩解 (m)・非常 (/) で飛んでから段を戻す方が少なければそちらを使う (planner)
+                self.follow_plan(pc_plan('brake', self.prev_b, cur_b, max_brake), 'prev_b', emu=False)
                 self.prev_b = cur_b
 
         is_st, is_sl = (raw_btns[9]==1), (raw_btns[10]==1)
         if is_st != self.p_start:
-            pydirectinput.keyDown(KEY_START) if is_st else pydirectinput.keyUp(KEY_START)
+            self.out.key_down(KEY_START) if is_st else self.out.key_up(KEY_START)
             self.p_start = is_st
         if is_sl != self.p_select:
-            pydirectinput.keyDown(KEY_SELECT) if is_sl else pydirectinput.keyUp(KEY_SELECT)
+            self.out.key_down(KEY_SELECT) if is_sl else self.out.key_up(KEY_SELECT)
             self.p_select = is_sl
\ No newline at end of file
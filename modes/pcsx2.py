@@ -1,30 +1,21 @@
 # modes/pcsx2.py
-import time
-import pydirectinput
 from const import *
 from .base import BaseLogic
+from .planner import plan_config, plan_axis_move
 
 class Pcsx2Logic(BaseLogic):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, out=None):
+        super().__init__(out)
         self.prev_axis = 0
 
     def reset(self):
         super().reset()
         self.prev_axis = 0
-        pydirectinput.keyUp(KEY_PCSX2_POWER_INC)
-
-    def press_emu(self, key):
-        pydirectinput.keyDown(key)
-        time.sleep(PCSX2_PRESS_DURATION)
-        pydirectinput.keyUp(key)
-        time.sleep(PCSX2_RELEASE_DURATION)
+        self.out.key_up(KEY_PCSX2_POWER_INC)
 
     def update(self, raw_p, raw_b, raw_btns, context):
-        brake_mode = context.get('brake_mode', '1')
         is_midosuji = context.get('midosuji_mode', False)
         is_ae100 = context.get('ae100_mode', False)
-        is_787 = context.get('mode_787', False)
         max_brake = context['max_brake']
 
         # 1. 値の補正
@@ -50,8 +41,9 @@ class Pcsx2Logic(BaseLogic):
             self.needs_sync = False
             return
 
-        B_INC = KEY_PCSX2_BRAKE_DEC if is_midosuji else KEY_PCSX2_BRAKE_INC
-        B_DEC = KEY_PCSX2_BRAKE_INC if is_midosuji else KEY_PCSX2_BRAKE_DEC
+        # ★ハンドルが再び動いたら未送信の段送りを捨て、ゲーム側の到達位置から差分だけ送り直す
+        if cur_axis != self.prev_axis:
+            self.cancel_pending()
 
         # ---------------------------------------------------------
         # 4. AE100 特殊処理 (定速制御)
@@ -60,72 +52,31 @@ class Pcsx2Logic(BaseLogic):
             # --- パターンA: Pからブレーキへ移動した時 ---
             if cur_axis < 0 and self.prev_axis > 0:
                 if self.prev_axis == 5:
-                    pydirectinput.keyUp(KEY_PCSX2_POWER_INC) # zを離す
-                    time.sleep(0.05) # ★リリース・ガード
-                self.press_emu(KEY_PCSX2_N)
-                time.sleep(PCSX2_RESET_WAIT)
+                    # zを離す (★リリース・ガード付き。後続のNに追い越されないよう優先キューに積む)
+                    self.out.key_up(KEY_PCSX2_POWER_INC, self, {'prev_axis': 4}, urgent=True, guard=PCSX2_RELEASE_GUARD)
+                self.press_emu(KEY_PCSX2_N, settle=PCSX2_RESET_WAIT, urgent=True, prev_axis=0)
                 self.prev_axis = 0
             
             # --- パターンB: P5からP4以下へ移動した時 ---
             elif self.prev_axis == 5 and cur_axis < 5:
-                pydirectinput.keyUp(KEY_PCSX2_POWER_INC) # zを離す
-                time.sleep(0.05) # ★リリース・ガード
-                self.prev_axis = 4 # 一旦P4にいたことにして下の軸ロジックへ流す
+                # zを離す (★リリース・ガード付き。後続のNに追い越されないよう優先キューに積む)
+                # 一旦P4にいたことにして下の軸ロジックへ流す
+                self.out.key_up(KEY_PCSX2_POWER_INC, self, {'prev_axis': 4}, urgent=True, guard=PCSX2_RELEASE_GUARD)
+                self.prev_axis = 4
             
             # --- パターンC: P5に到達し、かつブレーキが0の時 (定速開始) ---
             elif cur_axis == 5 and cur_b == 0:
                 if self.prev_axis < 5:
-                    diff = 4 - max(0, self.prev_axis)
-                    if diff > 0:
-                        for _ in range(diff): self.press_emu(KEY_PCSX2_POWER_INC)
-                    pydirectinput.keyDown(KEY_PCSX2_POWER_INC)
+                    # ブレーキ側から来た時も planner が N を経由して P4 まで上げる
+                    self.follow_plan(plan_axis_move(plan_config(context), self.prev_axis, 4))
+                    self.out.key_down(KEY_PCSX2_POWER_INC, self, {'prev_axis': 5})
                     self.prev_axis = 5
                 return
 
         # ---------------------------------------------------------
         # 5. 軸移動ロジック
         # ---------------------------------------------------------
+        # ★送るキーの手順は planner の表から引く (御堂筋線の反転・787系の非常キー無しも表に含む)
         if cur_axis != self.prev_axis:
-            # 非常ブレーキ
-            if cur_axis == -(max_brake + 1) and not is_787:
-                self.press_emu(KEY_PCSX2_EMG)
-            
-            # Nへの復帰
-            elif cur_axis == 0 and self.prev_axis != 0:
-                self.press_emu(KEY_PCSX2_N)
-                time.sleep(PCSX2_RESET_WAIT)
-            
-            # 境界またぎ
-            elif (cur_axis > 0 and self.prev_axis < 0) or (cur_axis < 0 and self.prev_axis > 0):
-                self.press_emu(KEY_PCSX2_N)
-                time.sleep(PCSX2_RESET_WAIT)
-                steps = abs(cur_axis)
-                if cur_axis > 0:
-                    for _ in range(steps): self.press_emu(KEY_PCSX2_POWER_INC)
-                else:
-                    if brake_mode == "1":
-                        for _ in range(steps): self.press_emu(KEY_PCSX2_POWER_DEC)
-                    else:
-                        for _ in range(steps): self.press_emu(B_INC)
-            
-            # 同一象限内
-            else:
-                diff = cur_axis - self.prev_axis
-                if diff > 0: # +方向
-                    if cur_axis > 0:
-                        for _ in range(abs(diff)): self.press_emu(KEY_PCSX2_POWER_INC)
-                    else:
-                        if brake_mode == "1":
-                            for _ in range(abs(diff)): self.press_emu(KEY_PCSX2_POWER_INC)
-                        else:
-                            for _ in range(abs(diff)): self.press_emu(B_DEC)
-                elif diff < 0: # -方向
-                    if cur_axis > 0:
-                        for _ in range(abs(diff)): self.press_emu(KEY_PCSX2_POWER_DEC)
-                    else:
-                        if brake_mode == "1":
-                            for _ in range(abs(diff)): self.press_emu(KEY_PCSX2_POWER_DEC)
-                        else:
-                            for _ in range(abs(diff)): self.press_emu(B_INC)
-            
-            self.prev_axis = cur_axis
\ No newline at end of file
+            self.follow_plan(plan_axis_move(plan_config(context), self.prev_axis, cur_axis))
+            self.prev_axis = cur_axis
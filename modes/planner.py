@@ -0,0 +1,136 @@
+# modes/planner.py
+# ノッチ移動 (今の段 → 目標の段) で送るキーの手順表
+# 各キー操作を「段の間の辺」とみなし、かかる時間 (押下幅・解放待ち・リセット待ち) が最小の手順を
+# 最短経路 (ダイクストラ法) で求める。Nキーで一気に飛んでから1段ずつ戻す方が速い場合はそちらを選ぶ
+# 非常キーは目標が非常の時だけ使う (途中の段へ行くために非常を経由すると、ゲームによっては減点・緩解遅れ・
+# ロックアウトになるため、経路の辺には含めない)
+# 設定の組ごとに全組み合わせを1回だけ作り、以降の update は表を引くだけにする
+import heapq
+from functools import lru_cache
+
+from const import *
+
+MAX_AXIS = 5 # 力行側の最大 (AE100/京阪の定速を含む)
+
+# --- PCSX2/RPCS3 (軸: 力行が正、ブレーキが負、非常は -(max_brake+1)) ---
+def plan_config(context, has_emg=True):
+    """
+    context から手順表のキー (brake_mode, max_brake, 反転, 非常キーあり) を作る
+    has_emg=False は非常キーを使わず段送りで非常まで入れる (RPCS3)。787系も同様
+    """
+    return (context.get('brake_mode', '1'), context['max_brake'],
+            context.get('midosuji_mode', False),
+            has_emg and not context.get('mode_787', False))
+
+@lru_cache(maxsize=None)
+def plan_table(config):
+    """{(prev_axis, cur_axis): 手順} の表。手順は (キー, 送った後の軸, 優先か, 送った後の待ち) の並び"""
+    axes = range(-(config[1] + 1), MAX_AXIS + 1)
+    table = {}
+    for prev in axes:
+        paths = _emu_paths(config, prev)
+        for cur in axes:
+            table[(prev, cur)] = paths[cur]
+    return table
+
+def plan_axis_move(config, prev_axis, cur_axis):
+    steps = plan_table(config).get((prev_axis, cur_axis))
+    if steps is None: # 段数設定を変えた直後など、表の範囲外から動く時
+        steps = _emu_paths(config, prev_axis)[cur_axis]
+    return steps
+
+def _emu_paths(config, prev):
+    """prev から各軸への手順。非常へは (非常キーがあれば) 非常キー1回で入れる"""
+    paths = _shortest_paths(prev, lambda axis: _emu_edges(config, axis))
+    eb = -(config[1] + 1)
+    if config[3] and prev != eb:
+        paths[eb] = ((KEY_PCSX2_EMG, eb, True, 0),)
+    return paths
+
+def _emu_edges(config, axis):
+    """軸 axis から1回のキー操作で行ける先: (キー, 行き先, コスト, 優先か, 待ち)"""
+    brake_mode, max_brake, inverted, has_emg = config
+    eb = -(max_brake + 1)
+    # コストは µs の整数 (浮動小数の誤差で同点の比較がぶれないように)
+    press = int(round((PCSX2_PRESS_DURATION + PCSX2_RELEASE_DURATION) * 1e6))
+    reset = press + int(round(PCSX2_RESET_WAIT * 1e6))
+    B_INC = KEY_PCSX2_BRAKE_DEC if inverted else KEY_PCSX2_BRAKE_INC
+    B_DEC = KEY_PCSX2_BRAKE_INC if inverted else KEY_PCSX2_BRAKE_DEC
+    one_handle = (brake_mode == "1")
+    edges = []
+    # 1段送り (Nへは段送りでは入らず、必ずNキーで戻す)
+    if 0 <= axis < MAX_AXIS:
+        edges.append((KEY_PCSX2_POWER_INC, axis + 1, press, False, 0))
+    elif eb <= axis < -1:
+        edges.append((KEY_PCSX2_POWER_INC if one_handle else B_DEC, axis + 1, press, False, 0))
+    if axis > 1:
+        edges.append((KEY_PCSX2_POWER_DEC, axis - 1, press, False, 0))
+    elif eb < axis <= 0:
+        edges.append((KEY_PCSX2_POWER_DEC if one_handle else B_INC, axis - 1, press, False, 0))
+    # Nリセット (途中の段へ飛ぶ近道はNだけ。非常キーは _emu_paths で目標が非常の時だけ使う)
+    if axis != 0:
+        edges.append((KEY_PCSX2_N, 0, reset, True, PCSX2_RESET_WAIT))
+    return edges
+
+# --- JRETS/BVE (マスコン・ブレーキ別々。1回の押下を1とする) ---
+@lru_cache(maxsize=None)
+def pc_plan_table(handle, max_val):
+    """handle は 'mascon' か 'brake'。{(prev, cur): 手順} の表 (手順の形は plan_table と同じ)"""
+    top = max_val + 1 if handle == 'brake' else max_val
+    table = {}
+    for prev in range(top + 1):
+        paths = _pc_paths(handle, max_val, prev)
+        for cur in range(top + 1):
+            table[(prev, cur)] = paths[cur]
+    return table
+
+def pc_plan(handle, prev, cur, max_val=MAX_AXIS):
+    steps = pc_plan_table(handle, max_val).get((prev, cur))
+    if steps is None:
+        steps = _pc_paths(handle, max_val, prev)[cur]
+    return steps
+
+def _pc_paths(handle, max_val, prev):
+    """prev から各段への手順。ブレーキの非常へは非常キー1回で入れる"""
+    paths = _shortest_paths(prev, lambda val: _pc_edges(handle, max_val, val))
+    if handle == 'brake' and prev != max_val + 1:
+        paths[max_val + 1] = ((KEY_BRAKE_EMG, max_val + 1, True, 0),)
+    return paths
+
+def _pc_edges(handle, max_val, val):
+    edges = []
+    if handle == 'mascon':
+        # 同じ回数なら N キーを優先する (Nへは一発で戻す)
+        if val != 0: edges.append((KEY_MASCON_N, 0, 1, True, 0))
+        if val < max_val: edges.append((KEY_MASCON_UP, val + 1, 1, False, 0))
+        if val > 0: edges.append((KEY_MASCON_DOWN, val - 1, 1, False, 0))
+    else:
+        # 非常キーは _pc_paths で目標が非常の時だけ使う
+        if val != 0: edges.append((KEY_BRAKE_N, 0, 1, False, 0))
+        if val < max_val: edges.append((KEY_BRAKE_UP, val + 1, 1, False, 0))
+        if val > 0: edges.append((KEY_BRAKE_DOWN, val - 1, 1, False, 0))
+    return edges
+
+def _shortest_paths(start, edges):
+    """
+    start から各段への最短手順を返す
+    コストが同じなら「Nへ飛んだ後に段を戻す」回数の少ない方 (途中で緩解・非常を挟まない方)、
+    次に押す回数の少ない方、さらに同じなら先に見つけた方を選ぶ
+    """
+    best = {start: (0, 0, 0)}
+    path = {start: ()}
+    jumped = {start: False} # 直前の操作で2段以上飛んだか
+    heap = [(0, 0, 0, 0, start)]
+    order = 1
+    while heap:
+        cost, detour, n, _, node = heapq.heappop(heap)
+        if (cost, detour, n) > best[node]: continue
+        for key, nxt, c, urgent, settle in edges(node):
+            cand = (cost + c, detour + (1 if jumped[node] else 0), n + 1)
+            if nxt not in best or cand < best[nxt]:
+                best[nxt] = cand
+                path[nxt] = path[node] + ((key, nxt, urgent, settle),)
+                jumped[nxt] = abs(nxt - node) > 1
+                heapq.heappush(heap, cand + (order, nxt))
+                order += 1
+    return path
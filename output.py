@@ -0,0 +1,346 @@
+# output.py
+import threading
+from collections import deque
+
+from backends import PyDirectInputBackend
+from const import PCSX2_PRESS_DURATION, PCSX2_RELEASE_DURATION, TIMER_SPIN_WINDOW
+from timing import PerfClock
+
+class _Job:
+    """送出ジョブ1件。actions は分断されずに実行され、完了後に state が「到達済みの状態」になる"""
+    __slots__ = ('actions', 'owner', 'state', 'urgent', 't_queued', 't_input')
+
+    def __init__(self, actions, owner, state, urgent, t_queued, t_input=None):
+        self.actions = actions
+        self.owner = owner
+        self.state = state
+        self.urgent = urgent
+        self.t_queued = t_queued
+        self.t_input = t_input # このジョブを積む元になった入力の変化時刻 (遅延計測用)
+
+class KeyScheduler:
+    """
+    キーの押下/解放/待機を専用スレッドで順番に送出するクラス
+    モードロジックはジョブを積むだけで即座に戻るので、メインループ(入力・描画)は止まらない
+
+    ノッチ操作のジョブには「送出し終えた時点のロジックの状態」(例: prev_axis) を付けて積む。
+    ハンドルが再び動いた時は cancel() で未送信分を捨て、ゲーム側が実際に到達した状態から
+    差分だけを計画し直せる
+
+    非常ブレーキ・Nショートカットは優先キュー(urgent)に積み、通常の段送りより先に送出する。
+    送出中のジョブの「解放後の待ち」「リセット待ち」(wait) も優先ジョブが来た時点で打ち切るので、
+    優先ジョブの遅延は最大でも押下幅1回分 (PCSX2_PRESS_DURATION) 程度に収まる
+    ただし guard で付けた待ち (定速解除の z を離した後のリリースガード) だけは打ち切らない
+    (z を離した直後に N を押すと、ゲーム側が取りこぼすため)
+
+    待ち時間は time.sleep ではなく clock (PerfClock) の締め切りで管理する。
+    連続したジョブは前のジョブの締め切りを基準に次の締め切りを決めるので、
+    寝過ごしが段数分積み上がらない
+
+    実際のキー送出は backend (backends.py) が行う。待ちを挟まない押下/解放だけのジョブが
+    続けて積まれている時は、まとめて backend.send_batch() 1回で送る (JRETS/BVE の複数段送りなど)
+
+    threaded=False ならスレッドを起動せず、呼び出し側が pump() で時刻を進めながら送出させる
+    (timing.VirtualClock と組み合わせて、長時間の入力を実時間を待たずにシミュレーションする用)
+    """
+    def __init__(self, clock=None, backend=None, threaded=True):
+        self.clock = clock if clock is not None else PerfClock()
+        self.backend = backend # None なら初回送出時に PyDirectInputBackend を作る
+        self.threaded = threaded
+        # press_emu の押下幅・解放後の待ち (gamesim.py での調整用に上書きできる)
+        self.press_duration = PCSX2_PRESS_DURATION
+        self.release_duration = PCSX2_RELEASE_DURATION
+        self._urgent = deque()
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self._current = []   # 送出中のジョブ (まとめて送る時は複数)
+        self._reached = {}   # owner -> 送出済みジョブが到達させた状態
+        self._held = {}      # 押しているキー -> 押した時刻 (終了時に必ず離す)
+        self._next_t = 0.0   # 直前のジョブが終わった締め切り時刻
+        self._paused = None  # pump() で途中まで送ったジョブの (ジョブ, 次のアクション番号, 締め切り)
+        # 優先ジョブの「投入→キー送出」までの遅延 (秒) の直近の記録 (上限は URGENT_LATENCY_BOUND)
+        self.urgent_latency = deque(maxlen=256)
+        # 実際に送出できた押下幅 (keyDown→keyUp, 秒) の直近の記録
+        self.pulse_widths = deque(maxlen=512)
+        # ★ハンドル操作→送出の遅延計測 (latency.LatencyTracer)。None なら計測しない
+        self.tracer = None
+        self._t_begin = 0.0 # 送出中のジョブを送り始めた時刻
+        self._t_sent = 0.0  # 最後にキーを送った時刻
+
+    # --- 送出スレッド管理 ---
+    def start(self):
+        with self._cond:
+            if self._running: return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="KeyScheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """未送信のジョブを破棄し、押しっぱなしのキーを離してスレッドを止める"""
+        with self._cond:
+            self._urgent.clear()
+            self._jobs.clear()
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        if self._held:
+            self._output().send_batch([('up', key) for key in self._held])
+        self._held.clear()
+
+    def _output(self):
+        if self.backend is None:
+            with self._cond: # prepare() と送出スレッドが同時に作らないように
+                if self.backend is None:
+                    self.backend = PyDirectInputBackend()
+        return self.backend
+
+    def prepare(self):
+        """送出先を先に作っておく (最初のキー送出で pydirectinput の読み込みを待たないように)"""
+        try:
+            self._output()
+        except ImportError:
+            pass # 送出先が使えない環境では、実際に送る時に改めて失敗させる
+
+    def is_idle(self):
+        with self._cond:
+            return not self._urgent and not self._jobs and not self._current and self._paused is None
+
+    def latency_samples(self):
+        """直近の優先ジョブの送出遅延 (秒) を昇順で返す"""
+        with self._cond:
+            return sorted(self.urgent_latency)
+
+    def latency_stats(self):
+        """優先ジョブの送出遅延 (件数, p50, p99, 最大) を秒で返す (LatencyTracer.stats の1段階と同じ形)"""
+        samples = self.latency_samples()
+        if not samples: return 0, 0.0, 0.0, 0.0
+        n = len(samples)
+        return n, samples[n // 2], samples[min(n - 1, n * 99 // 100)], samples[-1]
+
+    def pulse_samples(self):
+        """直近の押下幅の実測値 (秒) を昇順で返す"""
+        with self._cond:
+            return sorted(self.pulse_widths)
+
+    def pulse_stats(self):
+        """押下幅の実測値 (件数, 最小, 中央値, 最大) を秒で返す。送出時間を詰める時の目安にする"""
+        samples = self.pulse_samples()
+        if not samples: return 0, 0.0, 0.0, 0.0
+        return len(samples), samples[0], samples[len(samples) // 2], samples[-1]
+
+    # --- ジョブ投入API (モードロジックから呼ぶ) ---
+    # owner/state を付けたジョブはノッチ操作として cancel() の対象になる
+    # settle は送出後に続けて待つ時間 (リセット待ち用。優先ジョブが来たら打ち切る)
+    # guard は送出後に必ず待つ時間 (定速解除のリリースガード用。優先ジョブが来ても打ち切らない)
+    # urgent=True のジョブは優先キューに積む (非常ブレーキ・Nショートカット用)
+    def key_down(self, key, owner=None, state=None, settle=0, urgent=False):
+        self._put([('down', key)], owner, state, settle, urgent)
+
+    def key_up(self, key, owner=None, state=None, settle=0, urgent=False, guard=0):
+        self._put([('up', key)], owner, state, settle, urgent, guard)
+
+    def press(self, key, owner=None, state=None, settle=0, urgent=False):
+        """待ち時間なしで押して離す (JRETS/BVE用)"""
+        self._put([('down', key), ('up', key)], owner, state, settle, urgent)
+
+    def press_emu(self, key, owner=None, state=None, settle=0, urgent=False):
+        """エミュレータが確実に拾えるよう、押下幅と解放後の待ちを付けて押す (PCSX2/RPCS3用)"""
+        # hold (押下幅) は打ち切らないが、wait (解放後の待ち) は優先ジョブが来たら打ち切る
+        self._put([('down', key), ('hold', self.press_duration),
+                   ('up', key), ('wait', self.release_duration)], owner, state, settle, urgent)
+
+    def cancel(self, owner=None):
+        """
+        owner の未送信のノッチ操作を破棄し、ゲーム側が最終的に到達する状態を返す
+        (送出中のジョブは最後まで送り切るので、その完了後の状態を含める)
+        破棄するものが無ければ空の辞書を返す。owner=None なら全ロジック分を破棄する
+        """
+        with self._cond:
+            dropped = 0
+            for q in (self._urgent, self._jobs):
+                keep = [j for j in q if j.state is None or (owner is not None and j.owner is not owner)]
+                dropped += len(q) - len(keep)
+                q.clear(); q.extend(keep)
+            if not dropped: return {}
+            if owner is None: return {}
+            state = dict(self._reached.get(owner, {}))
+            for cur in self._current:
+                if cur.owner is owner and cur.state:
+                    state.update(cur.state)
+            return state
+
+    def _put(self, actions, owner, state, settle, urgent, guard=0):
+        if settle > 0:
+            actions.append(('wait', settle))
+        if guard > 0:
+            actions.append(('guard', guard))
+        if self.threaded and not self._running:
+            self.start() # 初回投入時にスレッドを起動
+        with self._cond:
+            if state is not None:
+                if not self._has_pending(owner):
+                    # 送出待ちが無い = ロジック側の状態がそのままゲームの状態
+                    self._reached[owner] = {}
+                reached = self._reached[owner]
+                for name in state:
+                    reached.setdefault(name, getattr(owner, name))
+            t_input = self.tracer.origin() if self.tracer is not None else None
+            job = _Job(tuple(actions), owner, state, urgent, self.clock.now(), t_input)
+            (self._urgent if urgent else self._jobs).append(job)
+            self._cond.notify_all() # 送出中の待ちを打ち切らせるため全員起こす
+
+    def _has_pending(self, owner):
+        return any(j.owner is owner and j.state is not None
+                   for q in (self._current, self._urgent, self._jobs) for j in q)
+
+    # --- 送出スレッド本体 ---
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self._urgent and not self._jobs:
+                    self._cond.wait()
+                if not self._running: return
+                batch = self._take_batch()
+            # 続けて送る時は前のジョブの締め切りを基準にする (誤差を積み上げない)
+            t = max(self._next_t, self.clock.now())
+            try:
+                self._begin(batch)
+                if len(batch) > 1:
+                    self._send_batch([a for job in batch for a in job.actions])
+                else:
+                    for act, arg in batch[0].actions:
+                        t = self._do(act, arg, t)
+            finally:
+                self._finish(batch, t)
+
+    def _take_batch(self):
+        # _cond を持った状態で呼ぶ
+        q = self._urgent if self._urgent else self._jobs
+        batch = [q.popleft()]
+        if _is_instant(batch[0]):
+            # 待ちの無いジョブが続いていれば同じキューからまとめて取り出す
+            while q and _is_instant(q[0]):
+                batch.append(q.popleft())
+        self._current = batch
+        return batch
+
+    def _begin(self, batch):
+        now = self._t_begin = self.clock.now()
+        for job in batch:
+            if job.urgent:
+                self._record_latency(now - job.t_queued)
+            if self.tracer is not None and job.t_input is not None:
+                self.tracer.record('emit_start', now - job.t_queued)
+
+    def _finish(self, batch, t):
+        self._next_t = t
+        tracer = self.tracer
+        if tracer is not None:
+            for job in batch:
+                if job.t_input is not None and not all(act in _WAITS for act, _ in job.actions):
+                    tracer.record('emit_end', self._t_sent - self._t_begin)
+                    tracer.record('total', self._t_sent - job.t_input)
+        with self._cond:
+            for job in batch:
+                if job.state is not None:
+                    self._reached.setdefault(job.owner, {}).update(job.state)
+            self._current = []
+
+    # --- スレッドを使わない送出 (シミュレーション用) ---
+    def pump(self, until=None):
+        """
+        時刻 until までに送出されるはずのジョブを呼び出し元のスレッドで実行し、clock を until まで進める
+        until=None なら積まれているジョブを全て送り切る。待ちの途中で until になったジョブは
+        次の pump() で続きから送る (その間に優先ジョブが積まれていれば、解放後の待ちはそこで打ち切る)
+        """
+        clock = self.clock
+        while True:
+            if self._paused is None:
+                with self._cond:
+                    if not self._urgent and not self._jobs: break
+                    t = max(self._next_t, clock.now())
+                    if until is not None and t > until: break
+                    clock.sleep_until(t)
+                    batch = self._take_batch()
+                self._begin(batch)
+                if len(batch) > 1:
+                    self._send_batch([a for job in batch for a in job.actions])
+                    self._finish(batch, t)
+                    continue
+                job, i = batch[0], 0
+            else:
+                job, i, t = self._paused
+                self._paused = None
+            while i < len(job.actions):
+                act, arg = job.actions[i]
+                if act == 'wait' and self._urgent:
+                    t = clock.now() # 優先ジョブが来たので残りの待ちを打ち切る
+                elif act in _WAITS:
+                    if until is not None and t + arg > until:
+                        self._paused = (job, i, t)
+                        break
+                    t += arg
+                    clock.sleep_until(t)
+                else:
+                    t = self._do(act, arg, t)
+                i += 1
+            if self._paused is not None: break
+            self._finish([job], t)
+        if until is not None:
+            clock.sleep_until(until)
+
+    def _send_batch(self, actions):
+        self._output().send_batch(actions)
+        now = self._t_sent = self.clock.now()
+        for act, key in actions:
+            if act == 'down':
+                self._held[key] = now
+                continue
+            t_down = self._held.pop(key, None)
+            if t_down is not None:
+                # 同じまとめ送りの中で押して離したキーは、SendInput 1回分の幅 (ほぼ0) として記録する
+                self.pulse_widths.append(now - t_down)
+
+    def _do(self, act, arg, t):
+        """アクションを1つ実行し、次のアクションの基準となる締め切り時刻を返す"""
+        if act == 'down':
+            self._output().key_down(arg)
+            self._held[arg] = self._t_sent = self.clock.now()
+        elif act == 'up':
+            self._output().key_up(arg)
+            now = self._t_sent = self.clock.now()
+            t_down = self._held.pop(arg, None)
+            if t_down is not None:
+                self.pulse_widths.append(now - t_down)
+        elif act in ('hold', 'guard'):
+            t += arg
+            self.clock.sleep_until(t)
+        elif act == 'wait':
+            # 優先ジョブが積まれたら残りの待ちを打ち切る
+            t += arg
+            with self._cond:
+                while self._running:
+                    if self._urgent: return self.clock.now()
+                    remain = t - self.clock.now()
+                    if remain <= TIMER_SPIN_WINDOW: break
+                    self._cond.wait(remain - TIMER_SPIN_WINDOW)
+            self.clock.sleep_until(t)
+        return t
+
+    def _record_latency(self, latency):
+        with self._cond:
+            self.urgent_latency.append(latency)
+
+# 時間を進めるだけのアクション (hold: 押下幅、wait: 解放後・リセット待ち (打ち切れる)、guard: リリースガード)
+_WAITS = ('hold', 'wait', 'guard')
+
+def _is_instant(job):
+    """押下/解放だけで待ちを含まないジョブか (他のジョブとまとめて送れる)"""
+    return all(act in ('down', 'up') for act, _ in job.actions)
+
+# 全モード共通の送出キュー (出力先のキーボードは1つなので共有する)
+scheduler = KeyScheduler()
@@ -0,0 +1,140 @@
+# sampler.py
+import threading
+import time
+
+from const import *
+from inputs import StableNotchReader, decode_table
+
+# 電気ブレーキの段 → 自動空気ブレーキの段 (段で引ける表にしておく。段で引くので配線の違うコントローラーでも共通)
+_AUTO_BRAKE_OF = [0] * (max(ELECTRIC_BRAKE_MAP.values()) + 1)
+for _code, _notch in ELECTRIC_BRAKE_MAP.items(): _AUTO_BRAKE_OF[_notch] = AUTO_BRAKE_MAP[_code]
+
+class NotchPipeline:
+    """
+    ビットパターン → 段数への変換、ノイズ除去、表示用の段数計算、モードロジックの呼び出しをまとめたクラス
+    入力スレッドからも、ジョイスティック以外の入力源からも同じ手順で使えるようにしている
+    """
+    def __init__(self, logics, tracer=None, table=None):
+        self.logics = logics
+        self.tracer = tracer # latency.LatencyTracer (各段階の所要時間を記録する)
+        # ★ボタンマスク → (raw_p, raw_b) は inputs.DecodeTable を添字で引くだけにする
+        self.table = table if table is not None else decode_table()
+        # フィルタの「通過途中に読めうる段」も、その配線の対応表 (ビットパターン → 段) から作る
+        self.mascon_filter = StableNotchReader(0, self.table.mascon_map, NOTCH_SETTLE_US)
+        # ★ブレーキは常に電気ブレーキの段で揃えてから (自動空気ブレーキならその後で) 変換する
+        self.brake_filter = StableNotchReader(0, self.table.brake_map, NOTCH_SETTLE_US)
+
+    def deadline(self):
+        """保留中の段を確定させるため、次に step を呼ぶべき時刻 (無ければ None)"""
+        deadlines = [d for d in (self.mascon_filter.deadline, self.brake_filter.deadline) if d is not None]
+        return min(deadlines) if deadlines else None
+
+    def filter_stats(self):
+        return {"mascon": self.mascon_filter.stats(), "brake": self.brake_filter.stats()}
+
+    def step(self, mask, raw_btns, context, t=None, t_read=None):
+        """
+        1サンプル分 (mask はボタンのビットマスク) を処理し、表示用の (display_p, display_b) を返す。t は処理する時刻 (秒、省略時は現在)
+        t_read はその入力が変化した時刻 (遅延計測用。None なら入力の変化ではないので計測しない)
+        """
+        game_mode = context['game_mode']
+        brake_mode = context['brake_mode']
+        max_brake = context['max_brake']
+        if t is None: t = time.perf_counter()
+        tracer = self.tracer if t_read is not None else None
+        if tracer is not None: tracer.begin(t_read, t)
+
+        raw_p, raw_b = self.table.pairs[mask]
+        cur_p = min(self.mascon_filter.update(raw_p, t), context['max_power'])
+        cur_b = self.brake_filter.update(raw_b, t)
+        if game_mode not in ["PCSX2", "RPCS3"] and brake_mode == "2":
+             cur_b = _AUTO_BRAKE_OF[cur_b]
+        if tracer is not None: tracer.mark('filter')
+        
+        if game_mode in ["PCSX2", "RPCS3"]:
+             if cur_b == 14: display_b = max_brake + 1
+             elif context['midosuji_mode'] and cur_b > max_brake: display_b = max_brake
+             else: display_b = min(cur_b, max_brake)
+        elif brake_mode == "1":
+             if cur_b == 14: display_b = max_brake + 1
+             else: display_b = min(cur_b, max_brake)
+        else:
+             display_b = cur_b 
+        display_p = 0 if display_b > 0 else cur_p
+
+        self.logics[game_mode].update(cur_p, cur_b, raw_btns, context)
+        if tracer is not None:
+            tracer.mark('logic')
+            tracer.end()
+        return display_p, display_b
+
+class InputSampler:
+    """
+    描画 (FPS) とは独立して入力を処理し、NotchPipeline を回すスレッド
+    描画側は snapshot (display_p, display_b, b_val, p_pat) を読むだけにする
+
+    JoyState の変化か設定の変更 (set_context) で起こされた時だけ動き、それ以外は眠っている。
+    表示が変わった時は on_snapshot を呼んで描画側を起こす
+
+    ※SDLのジョイスティック状態はメインスレッドのイベント処理でしか更新されないため、
+      メインループはイベント待ち (または INPUT_POLL_HZ の汲み上げ) で JoyState を更新する
+    """
+    def __init__(self, joy_state, pipeline, context, lock, on_snapshot=None):
+        self.joy_state = joy_state
+        self.pipeline = pipeline
+        self.context = context # 設定が変わったらメインスレッドが新しい辞書に差し替える
+        self.lock = lock       # ロジックの reset() と update() を排他にする
+        self.on_snapshot = on_snapshot
+        self.snapshot = (0, 0, 0, (0, 0, 0))
+        self.t_ready = None # 最初の入力を処理し終えた時刻 (起動時間の計測用)
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+        joy_state.listener = self._wakeup.set
+
+    def set_context(self, context):
+        """設定 (context) を差し替えて入力スレッドを起こす"""
+        self.context = context
+        self._wakeup.set()
+
+    def start(self):
+        self._running = True
+        self._wakeup.set() # 初回は入力を待たずに同期させる
+        self._thread = threading.Thread(target=self._run, name="InputSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        last_state, last_ctx = None, None
+        while self._running:
+            # 何も変わらなければここで眠る (タイムアウトは取りこぼし対策の保険)
+            # ★保留中の段があれば、その確定時刻には起きる
+            timeout = SAMPLER_IDLE_TIMEOUT
+            deadline = self.pipeline.deadline()
+            if deadline is not None:
+                timeout = min(timeout, max(0.0, deadline - time.perf_counter()))
+            self._wakeup.wait(timeout)
+            self._wakeup.clear()
+            state = self.joy_state.state
+            ctx = self.context
+            logic = self.pipeline.logics[ctx['game_mode']]
+            due = deadline is not None and time.perf_counter() >= deadline
+            changed = state is not last_state or due # 保留した段の確定も、その入力の変化から計測する
+            # 入力・設定のどちらも変わっていなければ何もしない
+            if state is not last_state or ctx is not last_ctx or logic.needs_sync or due:
+                mask, b_val, p_pat, t_read = state
+                with self.lock:
+                    display_p, display_b = self.pipeline.step(mask, self.joy_state.btns, ctx,
+                                                              t_read=t_read if changed else None)
+                if self.t_ready is None: self.t_ready = time.perf_counter()
+                snapshot = (display_p, display_b, b_val, p_pat)
+                if snapshot != self.snapshot:
+                    self.snapshot = snapshot
+                    if self.on_snapshot is not None: self.on_snapshot()
+                last_state, last_ctx = state, ctx
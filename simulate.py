@@ -0,0 +1,91 @@
+# simulate.py
+# 記録した入力 (input_trace.py) を仮想時刻で各モードのロジックに流し、送出されるキーの時系列を作る
+# 押下幅・待ち時間は VirtualClock 上で進むだけなので、1日分の記録でも数秒で終わる
+import sys
+import time
+
+from backends import RecordingBackend
+from const import URGENT_LATENCY_BOUND
+from latency import LatencyTracer
+from input_trace import read_trace, mask_to_btns, settle_points
+from output import KeyScheduler
+from sampler import NotchPipeline
+from timing import VirtualClock
+
+from modes import default_context
+from modes.jrets import JretsLogic
+from modes.bve import BveLogic
+from modes.pcsx2 import Pcsx2Logic
+from modes.rpcs3 import Rpcs3Logic
+
+LOGIC_CLASSES = {
+    "JRETS": JretsLogic,
+    "BVE": BveLogic,
+    "PCSX2": Pcsx2Logic,
+    "RPCS3": Rpcs3Logic
+}
+
+def simulate(samples, game_mode, context=None, press_duration=None, release_duration=None, stats=None):
+    """
+    samples は (秒, b_val, p_pat, mask) の列 (read_trace の戻り値など)
+    送出されたキーを (仮想時刻, 'down' | 'up', key) のリストで返す
+    press_duration / release_duration を渡すと PCSX2/RPCS3 の押下幅・解放待ちを差し替える
+    stats に辞書を渡すと、StableNotchReader の統計 (NotchPipeline.filter_stats) と
+    仮想時刻での各段階の遅延 (LatencyTracer.stats、キー "latency")、押下幅 (KeyScheduler.pulse_stats、キー "pulse")、
+    優先キーの送出遅延 (KeyScheduler.latency_stats、キー "urgent") を書き込む
+    """
+    clock = VirtualClock()
+    backend = RecordingBackend(clock)
+    out = KeyScheduler(clock, backend, threaded=False)
+    if press_duration is not None: out.press_duration = press_duration
+    if release_duration is not None: out.release_duration = release_duration
+    tracer = out.tracer = LatencyTracer(clock=clock)
+    pipeline = NotchPipeline({game_mode: LOGIC_CLASSES[game_mode](out)}, tracer)
+    ctx = default_context(game_mode)
+    if context: ctx.update(context)
+
+    for t, b_val, p_pat, mask, t_read in settle_points(samples, pipeline):
+        out.pump(t) # この入力が来るまでに送り終わるはずのキーを送る
+        pipeline.step(mask, mask_to_btns(mask), ctx, t, t_read)
+    out.pump() # 残りを送り切る
+    if stats is not None:
+        stats.update(pipeline.filter_stats())
+        stats["latency"] = tracer.stats()
+        stats["pulse"] = out.pulse_stats()
+        stats["urgent"] = out.latency_stats()
+    return backend.events
+
+def main(argv):
+    """python simulate.py 記録ファイル [--timeline] : 全モードで記録を再生し、送出キー数と所要時間を表示する"""
+    args = [a for a in argv if not a.startswith('--')]
+    if not args:
+        print(main.__doc__)
+        return 1
+    samples = list(read_trace(args[0]))
+    for game_mode in LOGIC_CLASSES:
+        t = time.perf_counter()
+        stats = {}
+        events = simulate(samples, game_mode, stats=stats)
+        elapsed = time.perf_counter() - t
+        span = events[-1][0] if events else 0.0
+        print(f"{game_mode:6s}: {len(samples)} samples, {len(events)} key events, "
+              f"virtual {span:.1f} s, wall {elapsed:.3f} s")
+        for name in ("mascon", "brake"):
+            st = stats[name]
+            print(f"  {name:6s} filter: {st['suppressed']} glitches suppressed, {st['delayed']} delayed "
+                  f"(mean {st['delay_mean'] * 1000:.2f} ms / max {st['delay_max'] * 1000:.2f} ms)")
+        for stage in ("read", "emit_start", "emit_end", "total"):
+            n, p50, p99, worst = stats["latency"][stage]
+            print(f"  {stage:10s} p50 {p50 * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  max {worst * 1000:7.2f} ms")
+        n, lo, p50, hi = stats["pulse"]
+        print(f"  pulse      min {lo * 1000:7.2f} ms  p50 {p50 * 1000:7.2f} ms  max {hi * 1000:7.2f} ms  (last {n} presses)")
+        n, p50, p99, worst = stats["urgent"]
+        print(f"  urgent     p50 {p50 * 1000:7.2f} ms  p99 {p99 * 1000:7.2f} ms  max {worst * 1000:7.2f} ms  "
+              f"(last {n} EB/N jobs, bound {URGENT_LATENCY_BOUND * 1000:.0f} ms)")
+        if '--timeline' in argv:
+            for t_ev, act, key in events:
+                print(f"  {t_ev * 1000:12.3f} ms  {act:4s} {key}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,42 @@
+# timing.py
+import time
+
+from const import TIMER_SPIN_WINDOW
+
+class PerfClock:
+    """
+    time.perf_counter 基準の高精度タイマー
+    time.sleep は粒度が粗く寝過ごしもあるため、締め切りの直前 (TIMER_SPIN_WINDOW) までは
+    sleep で待ち、残りはスピンして締め切りぴったりに戻る
+    """
+    def now(self):
+        return time.perf_counter()
+
+    def sleep_until(self, deadline):
+        remain = deadline - time.perf_counter()
+        if remain > TIMER_SPIN_WINDOW:
+            time.sleep(remain - TIMER_SPIN_WINDOW)
+        while time.perf_counter() < deadline:
+            pass
+
+    def sleep(self, seconds):
+        self.sleep_until(time.perf_counter() + seconds)
+
+class VirtualClock:
+    """
+    実時間を待たずに進む仮想時計 (シミュレーション用)
+    sleep_until は時刻を締め切りまで進めるだけで即座に戻る。
+    KeyScheduler(threaded=False) と組み合わせ、pump() で時刻を進めて使う
+    """
+    def __init__(self, start=0.0):
+        self.t = start
+
+    def now(self):
+        return self.t
+
+    def sleep_until(self, deadline):
+        if deadline > self.t:
+            self.t = deadline
+
+    def sleep(self, seconds):
+        self.sleep_until(self.t + seconds)
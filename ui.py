@@ -1,27 +1,119 @@
 # ui.py
 import pygame
+import json
 import math
+import os
+from functools import lru_cache
 from const import *
+from cache import LruCache
+
+# ★フォント: 名前 → 大きさ (全て meiryo の太字)。Font は初めて使う時に作る
+FONT_FACE = "meiryo"
+FONT_SIZES = {
+    'ui_label': 18, 'ui_bold': 20, 'keihan_bold': 20, 'header_title': 26, 'midosuji_title': 25,
+    'val': 28, 'val_small': 22, 'gauge': 24, 'gauge_s': 20, 'arrow': 20, 'keihan_b8': 22
+}
+
+class _FontTable(dict):
+    """fonts[名前] で引いた時に、まだ無ければその大きさの Font を作る辞書"""
+    def __missing__(self, key):
+        path, synthetic_bold = font_file()
+        font = pygame.font.Font(path, FONT_SIZES[key])
+        if synthetic_bold: font.set_bold(True)
+        self[key] = font
+        return font
 
 # フォント管理辞書
-fonts = {}
+fonts = _FontTable()
+_font_file = None
+# ★描画済み文字列のキャッシュ (fonts を直接 render せず render_text を通す)
+text_cache = LruCache(TEXT_CACHE_SIZE)
+
+# ★描画済みゲージのキャッシュ (ノッチ位置と表示モードの組ごとに1枚)
+GAUGE_BOX_W, GAUGE_BOX_H, GAUGE_SPACING = 110, 34, 6
+GAUGE_KEY_FIELDS = ('current_val', 'max_val', 'is_mascon', 'is_midosuji', 'is_ae100', 'is_keihan', 'is_yokusoku')
+gauge_cache = LruCache(GAUGE_CACHE_SIZE)
+# ★自動空気ブレーキの表示 (ハンドル位置4通り) も同様に1枚ずつ持つ
+AUTO_DIAL_REACH = 222 # 中心から表示の端までの最大距離 (ラベルの円 180+40 + 枠)
+dial_cache = LruCache(8)
+# ★ヘッダーのモード名 (御堂筋線の縁取り・AE100の帯など) もモードの組ごとに1回だけ作る
+header_cache = LruCache(32)
+
+def font_file():
+    """
+    FONT_FACE の太字のフォントファイルと、太字を擬似的に付ける必要があるかを返す
+    システムのフォント一覧の走査 (SysFont が毎回の起動で行う) は重いので、結果を FONT_CACHE_PATH に保存し、
+    次回からはファイルが残っている限りそれを使う。見つからなければ pygame 既定のフォント (None)
+    """
+    global _font_file
+    if _font_file is not None: return _font_file
+    try:
+        with open(FONT_CACHE_PATH, encoding='utf-8') as f:
+            cached = json.load(f)
+        if cached.get('face') == FONT_FACE and cached.get('path') and os.path.exists(cached['path']):
+            _font_file = (cached['path'], cached['synthetic_bold'])
+            return _font_file
+    except (OSError, ValueError, KeyError):
+        pass
+    # SysFont と同じ選び方: 太字のファイルが無ければ通常のファイルを太字にして使う
+    bold = pygame.font.match_font(FONT_FACE, bold=True)
+    regular = pygame.font.match_font(FONT_FACE)
+    path = bold or regular
+    _font_file = (path, path is None or bold is None or bold == regular)
+    if path is not None:
+        try:
+            with open(FONT_CACHE_PATH, 'w', encoding='utf-8') as f:
+                json.dump({'face': FONT_FACE, 'path': path, 'synthetic_bold': _font_file[1]}, f)
+        except OSError:
+            pass # 保存できなくても次回また探すだけ
+    return _font_file
 
 def init_fonts():
-    """main.pyでpygame.init()した後に呼ぶ"""
-    fonts['ui_label'] = pygame.font.SysFont("meiryo", 18, bold=True)
-    fonts['ui_bold'] = pygame.font.SysFont("meiryo", 20, bold=True)
-    fonts['keihan_bold'] = pygame.font.SysFont("meiryo", 20, bold=True)
-    fonts['header_title'] = pygame.font.SysFont("meiryo", 26, bold=True)
-    fonts['midosuji_title'] = pygame.font.SysFont("meiryo", 25, bold=True)
-    fonts['val'] = pygame.font.SysFont("meiryo", 28, bold=True)
-    fonts['val_small'] = pygame.font.SysFont("meiryo", 22, bold=True)
-    fonts['gauge'] = pygame.font.SysFont("meiryo", 24, bold=True)
-    fonts['gauge_s'] = pygame.font.SysFont("meiryo", 20, bold=True)
-    fonts['arrow'] = pygame.font.SysFont("meiryo", 20, bold=True)
-    fonts['keihan_b8'] = pygame.font.SysFont("meiryo", 22, bold=True)
+    """main.pyで pygame.font.init() した後に呼ぶ (Font 自体は初めて使う時に作る)"""
+    fonts.clear()
+    text_cache.invalidate() # フォントが変わったら描き直す
+    gauge_cache.invalidate()
+    dial_cache.invalidate()
+    header_cache.invalidate()
+
+def render_text(font_key, text, color, antialias=True):
+    """fonts[font_key] で描いた文字列の Surface を返す。同じ組は2回目以降キャッシュから返す
+    (共有されるので、返した Surface に直接描き込まないこと)"""
+    key = (font_key, text, color, antialias)
+    return text_cache.get_or_build(key, lambda: fonts[font_key].render(text, antialias, color))
+
+def text_cache_stats():
+    """文字列キャッシュの (ヒット数, ミス数, 保持件数)"""
+    return text_cache.stats()
+
+class DirtyWidget:
+    """
+    部分描画用の部品。描画内容を決める入力の組 (key) が前回と変わった時だけ、
+    前回描いた領域を背景色で消してから描き直し、画面転送が必要な Rect を返す
+    """
+    def __init__(self, bg_color=COLOR_BG):
+        self.bg_color = bg_color
+        self.key = None
+        self.rect = None
+
+    def invalidate(self):
+        """全画面を描き直した後などに呼ぶ (次回は必ず描く)"""
+        self.key = None
+        self.rect = None
+
+    def redraw(self, surface, key, draw_fn, *args, **kwargs):
+        """draw_fn は描いた範囲の Rect を返す関数。変化が無ければ None を返す"""
+        if key == self.key: return None
+        old = self.rect
+        if old is not None:
+            surface.fill(self.bg_color, old)
+        new = draw_fn(surface, *args, **kwargs)
+        self.key = key
+        self.rect = new
+        return new.union(old) if old is not None else new
 
 class Button:
-    def __init__(self, x, y, w, h, text, callback, color=(60,60,60), font_key='ui_bold'):
+    def __init__(self, x, y, w, h, text, callback, color=(60,60,60), font_key='ui_bold', bg_color=COLOR_HEADER_BG):
         self.rect = pygame.Rect(x, y, w, h)
         self.text = text
         self.callback = callback
@@ -29,6 +121,12 @@ class Button:
         self.font_key = font_key
         self.hover = False
         self.visible = True
+        self.dirty = DirtyWidget(bg_color)
+
+    def redraw(self, surface):
+        """表示内容 (文字・色・ホバー) が変わった時だけ描き直し、更新が必要な Rect を返す"""
+        if not self.visible: return None
+        return self.dirty.redraw(surface, (self.text, self.base_color, self.hover), self.draw)
 
     def draw(self, surface):
         if not self.visible: return
@@ -39,9 +137,10 @@ class Button:
         else:
             pygame.draw.rect(surface, (100, 100, 100), self.rect, 1, border_radius=4)
         
-        font = fonts.get(self.font_key, fonts['ui_bold'])
-        txt_surf = font.render(self.text, True, COLOR_TEXT)
+        font_key = self.font_key if self.font_key in FONT_SIZES else 'ui_bold'
+        txt_surf = render_text(font_key, self.text, COLOR_TEXT)
         surface.blit(txt_surf, txt_surf.get_rect(center=self.rect.center))
+        return self.rect
 
     def handle_event(self, event):
         if not self.visible: 
@@ -55,35 +154,62 @@ class Button:
             if self.rect.collidepoint(event.pos) and event.button in [1, 3]:
                 self.callback(event.button)
 
-def draw_solid_arc(surface, color, center, r_inner, r_outer, start_deg, end_deg):
+@lru_cache(maxsize=None)
+def _arc_outline(r_inner, r_outer, start_deg, end_deg):
+    """中心(0,0)基準の円弧帯の頂点列。半径と角度が同じなら2回目以降は計算しない"""
     points = []
-    cx, cy = center
     step = 0.5 
     angle = start_deg
     while angle <= end_deg:
         rad = math.radians(angle)
-        x = cx + r_outer * math.cos(rad)
-        y = cy - r_outer * math.sin(rad)
-        points.append((x, y))
+        points.append((r_outer * math.cos(rad), -r_outer * math.sin(rad)))
         angle += step
     rad_end = math.radians(end_deg)
-    points.append((cx + r_outer * math.cos(rad_end), cy - r_outer * math.sin(rad_end)))
+    points.append((r_outer * math.cos(rad_end), -r_outer * math.sin(rad_end)))
 
     angle = end_deg
     while angle >= start_deg:
         rad = math.radians(angle)
-        x = cx + r_inner * math.cos(rad)
-        y = cy - r_inner * math.sin(rad)
-        points.append((x, y))
+        points.append((r_inner * math.cos(rad), -r_inner * math.sin(rad)))
         angle -= step
     rad_start = math.radians(start_deg)
-    points.append((cx + r_inner * math.cos(rad_start), cy - r_inner * math.sin(rad_start)))
-    pygame.draw.polygon(surface, color, points)
+    points.append((r_inner * math.cos(rad_start), -r_inner * math.sin(rad_start)))
+    return tuple(points)
+
+def draw_solid_arc(surface, color, center, r_inner, r_outer, start_deg, end_deg):
+    cx, cy = center
+    points = [(cx + x, cy + y) for x, y in _arc_outline(r_inner, r_outer, start_deg, end_deg)]
+    return pygame.draw.polygon(surface, color, points)
+
+def invalidate_gauges(**match):
+    """指定した条件 (例: is_midosuji=True) に一致するゲージだけをキャッシュから捨てる"""
+    idx = [(GAUGE_KEY_FIELDS.index(name), val) for name, val in match.items()]
+    return gauge_cache.invalidate(lambda key: all(key[i] == val for i, val in idx))
+
+def invalidate_special_gauges():
+    """特殊モード (御堂筋・AE100・京阪・抑速) 用のゲージをまとめて捨てる"""
+    return gauge_cache.invalidate(lambda key: any(key[3:]))
 
 def draw_bar_gauge(surface, center_x, start_y, current_val, max_val, is_mascon, is_midosuji=False, is_ae100=False, is_keihan=False, is_yokusoku=False):
-    width = 110
-    box_h = 34
-    spacing = 6
+    """キャッシュ済みのゲージ画像を1回blitするだけで描く。描いた範囲を返す"""
+    key = (current_val, max_val, is_mascon, is_midosuji, is_ae100, is_keihan, is_yokusoku)
+    sprite = gauge_cache.get_or_build(key, lambda: _build_gauge_sprite(*key))
+    return surface.blit(sprite, (center_x - GAUGE_BOX_W // 2, start_y))
+
+def _build_gauge_sprite(current_val, max_val, is_mascon, is_midosuji, is_ae100, is_keihan, is_yokusoku):
+    # N + 段数 (+ ブレーキはEB) の箱を縦に並べた大きさ
+    rows = max_val + (1 if is_mascon else 2)
+    sprite = pygame.Surface((GAUGE_BOX_W, rows * (GAUGE_BOX_H + GAUGE_SPACING) - GAUGE_SPACING), pygame.SRCALPHA)
+    _render_bar_gauge(sprite, GAUGE_BOX_W // 2, 0, current_val, max_val, is_mascon,
+                      is_midosuji, is_ae100, is_keihan, is_yokusoku)
+    if pygame.display.get_surface() is not None:
+        sprite = sprite.convert_alpha() # 画面と同じ形式にしておくとblitが速い
+    return sprite
+
+def _render_bar_gauge(surface, center_x, start_y, current_val, max_val, is_mascon, is_midosuji=False, is_ae100=False, is_keihan=False, is_yokusoku=False):
+    width = GAUGE_BOX_W
+    box_h = GAUGE_BOX_H
+    spacing = GAUGE_SPACING
     x = center_x - width // 2 
     n_rect = pygame.Rect(x, start_y, width, box_h)
     
@@ -100,7 +226,7 @@ def draw_bar_gauge(surface, center_x, start_y, current_val, max_val, is_mascon,
         txt_col = COLOR_TEXT
     
     n_label = "0" if is_keihan else "N"
-    ren = fonts['gauge'].render(n_label, True, txt_col)
+    ren = render_text('gauge', n_label, txt_col)
     surface.blit(ren, ren.get_rect(center=n_rect.center))
 
     current_y = start_y + box_h + spacing
@@ -134,7 +260,7 @@ def draw_bar_gauge(surface, center_x, start_y, current_val, max_val, is_mascon,
             txt_col_val = COLOR_TEXT
 
         txt = ""
-        font_to_use = fonts['gauge']
+        font_to_use = 'gauge'
         if is_mascon:
             if is_keihan:
                 if i==3: txt="－"; 
@@ -152,16 +278,16 @@ def draw_bar_gauge(surface, center_x, start_y, current_val, max_val, is_mascon,
             if is_midosuji: txt = f"B{i+1}"
             elif is_keihan_nukitori:
                 txt = "抜取"
-                font_to_use = fonts['keihan_b8']
+                font_to_use = 'keihan_b8'
             elif is_yokusoku:
                 if i == 1:
                     txt = "抑速"
-                    font_to_use = fonts['keihan_b8'] 
+                    font_to_use = 'keihan_b8'
                 else:
                     txt = f"B{i-1}"
             else: txt = f"B{i}"
             
-        ren = font_to_use.render(txt, True, txt_col_val)
+        ren = render_text(font_to_use, txt, txt_col_val)
         surface.blit(ren, ren.get_rect(center=r.center))
         current_y += box_h + spacing
 
@@ -177,10 +303,31 @@ def draw_bar_gauge(surface, center_x, start_y, current_val, max_val, is_mascon,
             pygame.draw.rect(surface, COLOR_B_EMG, eb_rect, 1, border_radius=3)
             t_col = COLOR_TEXT
         
-        ren = fonts['gauge'].render("EB", True, t_col)
+        ren = render_text('gauge', "EB", t_col)
         surface.blit(ren, ren.get_rect(center=eb_rect.center))
+        bottom = eb_rect.bottom
+    else:
+        bottom = current_y - spacing
+
+    # 部分描画用: ゲージ全体の範囲を返す
+    return pygame.Rect(x, start_y, width, bottom - start_y)
 
 def draw_auto_brake_unit(surface, center_x, center_y, current_val):
+    """ハンドル位置ごとにキャッシュした表示を1回blitして描く。描いた範囲を返す"""
+    sprite, (off_x, off_y) = dial_cache.get_or_build(current_val, lambda: _build_dial_sprite(current_val))
+    return surface.blit(sprite, (center_x + off_x, center_y + off_y))
+
+def _build_dial_sprite(current_val):
+    # 中心を真ん中に置いたキャンバスに描き、実際に描いた範囲だけ切り出す
+    size = AUTO_DIAL_REACH * 2
+    canvas = pygame.Surface((size, size), pygame.SRCALPHA)
+    area = _render_auto_brake_unit(canvas, AUTO_DIAL_REACH, AUTO_DIAL_REACH, current_val).clip(canvas.get_rect())
+    sprite = canvas.subsurface(area).copy()
+    if pygame.display.get_surface() is not None:
+        sprite = sprite.convert_alpha()
+    return sprite, (area.x - AUTO_DIAL_REACH, area.y - AUTO_DIAL_REACH)
+
+def _render_auto_brake_unit(surface, center_x, center_y, current_val):
     center = (center_x, center_y)
     label_radius = 180 
     r_inner, r_outer = 172, 188
@@ -189,8 +336,9 @@ def draw_auto_brake_unit(surface, center_x, center_y, current_val):
     col_run = COLOR_N if current_val == 0 else COLOR_OFF_FILL
     col_svc = COLOR_B_SVC if current_val == 8 else COLOR_OFF_FILL
     
-    draw_solid_arc(surface, col_run, center, r_inner, r_outer, 200, 270 + overlap_angle)
-    draw_solid_arc(surface, col_svc, center, r_inner, r_outer, 270 - overlap_angle, 380)
+    # 部分描画用: 描いた範囲を全部まとめて返す
+    drawn = [draw_solid_arc(surface, col_run, center, r_inner, r_outer, 200, 270 + overlap_angle),
+             draw_solid_arc(surface, col_svc, center, r_inner, r_outer, 270 - overlap_angle, 380)]
     
     angles = { 0: 200, 1: 270, 2: 330, 3: 20 }
     target_angle = angles.get(current_val, 200)
@@ -202,16 +350,16 @@ def draw_auto_brake_unit(surface, center_x, center_y, current_val):
         lx = center[0] + label_radius * math.cos(math.radians(ang))
         ly = center[1] - label_radius * math.sin(math.radians(ang))
         is_active = (current_val == val)
-        pygame.draw.circle(surface, act_color if is_active else COLOR_OFF_FILL, (int(lx), int(ly)), 40)
+        drawn.append(pygame.draw.circle(surface, act_color if is_active else COLOR_OFF_FILL, (int(lx), int(ly)), 40))
         if not is_active:
             pygame.draw.circle(surface, act_color, (int(lx), int(ly)), 40, 2)
-        ren = fonts['gauge_s'].render(text, True, (255,255,255) if is_active else COLOR_TEXT)
+        ren = render_text('gauge_s', text, (255,255,255) if is_active else COLOR_TEXT)
         surface.blit(ren, ren.get_rect(center=(int(lx), int(ly))))
         
     angle_rad = math.radians(-target_angle)
     brass_len, wood_len = 35, 100
-    pygame.draw.line(surface, COLOR_HANDLE_BRASS, center, 
-                     (center[0] + (brass_len+30) * math.cos(angle_rad), center[1] + (brass_len+30) * math.sin(angle_rad)), 16)
+    drawn.append(pygame.draw.line(surface, COLOR_HANDLE_BRASS, center, 
+                     (center[0] + (brass_len+30) * math.cos(angle_rad), center[1] + (brass_len+30) * math.sin(angle_rad)), 16))
     
     grip_center_dist = brass_len + wood_len / 2
     grip_w = 28
@@ -225,16 +373,33 @@ def draw_auto_brake_unit(surface, center_x, center_y, current_val):
     rotated_grip = pygame.transform.rotate(grip_surf, target_angle)
     grip_x = center[0] + grip_center_dist * math.cos(angle_rad) + ox
     grip_y = center[1] + grip_center_dist * math.sin(angle_rad) + oy
-    surface.blit(rotated_grip, rotated_grip.get_rect(center=(grip_x, grip_y)))
+    drawn.append(surface.blit(rotated_grip, rotated_grip.get_rect(center=(grip_x, grip_y))))
     
     pygame.draw.circle(surface, COLOR_HANDLE_BRASS, center, 16)
     hole_surf = pygame.Surface((14, 14), pygame.SRCALPHA); hole_surf.fill(COLOR_HOLE)
     rotated_hole = pygame.transform.rotate(hole_surf, target_angle)
     surface.blit(rotated_hole, rotated_hole.get_rect(center=center))
+    return drawn[0].unionall(drawn[1:])
 
 # --- タイトル描画ロジック ---
 def draw_header_title(surface, game_mode, brake_mode, midosuji_mode, ae100_mode, keihan_mode, mode_787, header_h):
-    lbl_mode_title = fonts['header_title'].render("現在モード: ", True, COLOR_TEXT)
+    key = (game_mode, brake_mode, midosuji_mode, ae100_mode, keihan_mode, mode_787)
+    lbl_mode_title, lbl_mode_val = header_cache.get_or_build(key, lambda: _build_header_labels(*key))
+
+    rect_title = lbl_mode_title.get_rect()
+    base_center_y = header_h // 2
+    rect_title.midleft = (170, base_center_y)
+    
+    rect_val = lbl_mode_val.get_rect()
+    rect_val.midleft = (rect_title.right, base_center_y)
+    
+    surface.blit(lbl_mode_title, rect_title)
+    surface.blit(lbl_mode_val, rect_val)
+    return rect_title.union(rect_val)
+
+def _build_header_labels(game_mode, brake_mode, midosuji_mode, ae100_mode, keihan_mode, mode_787):
+    """「現在モード:」とモード名の画像を作る (draw_header_title がキャッシュする)"""
+    lbl_mode_title = render_text('header_title', "現在モード: ", COLOR_TEXT)
     
     if game_mode in ["PCSX2", "RPCS3"]:
         if midosuji_mode:
@@ -262,7 +427,7 @@ def draw_header_title(surface, game_mode, brake_mode, midosuji_mode, ae100_mode,
         col_stripe_blue = (0, 84, 171)
         col_stripe_red = (213, 44, 48)
         col_text = (237, 226, 212) 
-        base_surf = fonts['midosuji_title'].render(mode_name_str, True, col_text)
+        base_surf = render_text('midosuji_title', mode_name_str, col_text)
         w_text, h_text = base_surf.get_size()
         padding_x = 2
         stripe_h = 4 
@@ -276,7 +441,7 @@ def draw_header_title(surface, game_mode, brake_mode, midosuji_mode, ae100_mode,
         pygame.draw.rect(lbl_mode_val, col_stripe_red, rect_red)
 
     elif mode_name_str == "京阪8000系":
-        base_surf = fonts['keihan_bold'].render(mode_name_str, True, COLOR_KEIHAN_GOLD)
+        base_surf = render_text('keihan_bold', mode_name_str, COLOR_KEIHAN_GOLD)
         w_text, h_text = base_surf.get_size()
         padding_x = 10
         padding_y = 6
@@ -288,8 +453,8 @@ def draw_header_title(surface, game_mode, brake_mode, midosuji_mode, ae100_mode,
         lbl_mode_val.blit(base_surf, (padding_x, padding_y))
 
     elif mode_name_str == "御堂筋線":
-        base_surf = fonts['midosuji_title'].render(mode_name_str, True, header_color)
-        outline_surf = fonts['midosuji_title'].render(mode_name_str, True, (235, 235, 235))
+        base_surf = render_text('midosuji_title', mode_name_str, header_color)
+        outline_surf = render_text('midosuji_title', mode_name_str, (235, 235, 235))
         stroke = 2
         w, h = base_surf.get_size()
         lbl_mode_val = pygame.Surface((w + stroke*2, h + stroke*2), pygame.SRCALPHA)
@@ -300,14 +465,6 @@ def draw_header_title(surface, game_mode, brake_mode, midosuji_mode, ae100_mode,
         lbl_mode_val.blit(base_surf, (stroke, stroke))
         
     else:
-        lbl_mode_val = fonts['header_title'].render(mode_name_str, True, header_color)
+        lbl_mode_val = render_text('header_title', mode_name_str, header_color)
 
-    rect_title = lbl_mode_title.get_rect()
-    base_center_y = header_h // 2
-    rect_title.midleft = (170, base_center_y)
-    
-    rect_val = lbl_mode_val.get_rect()
-    rect_val.midleft = (rect_title.right, base_center_y)
-    
-    surface.blit(lbl_mode_title, rect_title)
-    surface.blit(lbl_mode_val, rect_val)
\ No newline at end of file
+    return lbl_mode_title, lbl_mode_val
\ No newline at end of file
@@ -0,0 +1,154 @@
+# watchdog.py
+# メインループの1周が予算 (WATCHDOG_BUDGET) を超えて止まった時に、メインスレッドのスタックを何回か採って
+# 「どの段階で・どの関数が」止めていたかを短いレポートに書き出す
+# メインループ側は段階名と時刻を書き換えるだけ (ロックも取らない) なので、常時有効にしておける
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from const import (WATCHDOG_BUDGET, WATCHDOG_SAMPLE_INTERVAL, WATCHDOG_MAX_SAMPLES, WATCHDOG_REPORT_PATH,
+                   WATCHDOG_REPORT_MAX_BYTES)
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_STACK_DEPTH = 6 # レポートに載せるスタックの深さ (内側から)
+
+def frame_name(frame):
+    """フレームの関数名。メソッドは Pcsx2Logic.update、モジュールの関数は ui.draw_solid_arc の形"""
+    code = frame.f_code
+    qualname = getattr(code, 'co_qualname', code.co_name)
+    if '.' in qualname and '<locals>' not in qualname: return qualname
+    module = frame.f_globals.get('__name__', '?')
+    if module == '__main__': module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}.{code.co_name}"
+
+def _is_own(frame):
+    """このアプリのソースのフレームか (pygame や標準ライブラリの中は除く)"""
+    return os.path.abspath(frame.f_code.co_filename).startswith(_BASE_DIR)
+
+def summarize(frame):
+    """(原因とみなす関数, 外側から並べたスタック) を返す。原因はスタックの一番内側にあるアプリ自身の関数"""
+    names = []
+    culprit = None
+    while frame is not None:
+        where = f"{frame_name(frame)}:{frame.f_lineno}"
+        if culprit is None and _is_own(frame): culprit = where
+        names.append(where)
+        frame = frame.f_back
+    if culprit is None: culprit = names[0] if names else "?"
+    return culprit, tuple(reversed(names[:_STACK_DEPTH]))
+
+class FrameWatchdog:
+    """
+    メインループの停止を監視するスレッド
+    メインループは周回の始めに begin(段階)、途中で mark(段階)、待ちに入る前に idle() を呼ぶ
+    (イベント待ちや clock.tick で眠っている間は止まっているとみなさない)
+    thread_names に渡した名前のスレッド (入力スレッドなど) も、止まっている間は一緒にスタックを採る
+    (メインスレッドが logic_lock 待ちで止まった時に、ロックを持っている側を知るため)
+    """
+    def __init__(self, budget=WATCHDOG_BUDGET, path=WATCHDOG_REPORT_PATH, thread_names=(),
+                 interval=WATCHDOG_SAMPLE_INTERVAL, max_samples=WATCHDOG_MAX_SAMPLES, max_bytes=WATCHDOG_REPORT_MAX_BYTES):
+        self.budget = budget
+        self.path = path
+        self.max_bytes = max_bytes
+        self.thread_names = tuple(thread_names)
+        self.interval = interval
+        self.max_samples = max_samples
+        self.target = threading.current_thread() # 監視するのは作ったスレッド (メインスレッド)
+        self.stage = None
+        self.stalls = 0
+        self._t_start = None # 周回の開始時刻。None は待ち中
+        self._iteration = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- メインループから呼ぶ ---
+    def begin(self, stage):
+        self.stage = stage
+        self._iteration += 1
+        self._t_start = time.perf_counter()
+
+    def mark(self, stage):
+        self.stage = stage
+
+    def idle(self):
+        self._t_start = None
+
+    # --- 監視スレッド ---
+    def start(self):
+        if self.budget is None or self._thread is not None: return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="FrameWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self):
+        reported = None
+        # ★普段は予算の半分ごとに時刻を見るだけ。予算を超えた周回は1回だけ採取する
+        while not self._stop.wait(self.budget / 2):
+            t_start, iteration = self._t_start, self._iteration
+            if t_start is None or iteration == reported: continue
+            if time.perf_counter() - t_start < self.budget: continue
+            reported = iteration
+            self._write(self._sample(iteration, t_start))
+
+    def _stalled(self, iteration):
+        return self._iteration == iteration and self._t_start is not None
+
+    def _sample(self, iteration, t_start):
+        """その周回が終わるまで (最大 max_samples 回) スタックを採り、レポートの材料を返す"""
+        # 名前で探すのは、送出スレッドのように後から作られるスレッドもあるため
+        threads = [self.target] + [t for t in threading.enumerate() if t.name in self.thread_names]
+        culprits = {t.name: Counter() for t in threads}
+        stacks = {t.name: Counter() for t in threads}
+        stages = Counter()
+        n = 0
+        while n < self.max_samples and self._stalled(iteration) and not self._stop.is_set():
+            frames = sys._current_frames()
+            stages[self.stage] += 1
+            for t in threads:
+                frame = frames.get(t.ident)
+                if frame is None: continue
+                culprit, stack = summarize(frame)
+                culprits[t.name][culprit] += 1
+                stacks[t.name][(culprit, stack)] += 1
+            del frames # 他スレッドのフレームを掴んだままにしない
+            n += 1
+            time.sleep(self.interval)
+        ongoing = self._stalled(iteration)
+        return {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed": time.perf_counter() - t_start,
+            "ongoing": ongoing,
+            "stage": stages.most_common(1)[0][0] if stages else self.stage,
+            "samples": n,
+            "threads": [(name, culprits[name], stacks[name]) for name in culprits if culprits[name]]
+        }
+
+    def _write(self, report):
+        """1回の停止を数行にまとめて書き出す (スレッドごとに多かった原因の上位と、その代表的なスタック)"""
+        self.stalls += 1
+        head = "over" if report["ongoing"] else "took"
+        lines = [f"{report['time']} stall: loop {head} {report['elapsed'] * 1000:.1f} ms "
+                 f"(budget {self.budget * 1000:.0f} ms) in stage '{report['stage']}', {report['samples']} samples"]
+        for name, culprits, stacks in report["threads"]:
+            for culprit, count in culprits.most_common(3):
+                lines.append(f"  [{name}] {culprit}  {count}/{report['samples']}")
+            (_, stack), _ = stacks.most_common(1)[0]
+            lines.append(f"      {' > '.join(stack)}")
+        text = "\n".join(lines)
+        print(text.splitlines()[0] + f" -> {self.path}")
+        try:
+            # ★常時有効なので、大きくなったら1世代だけ残して書き直す (ファイルが増え続けないように)
+            if os.path.exists(self.path) and os.path.getsize(self.path) > self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(text + "\n")
+        except OSError as e:
+            print(f"Watchdog: could not write {self.path}: {e}")